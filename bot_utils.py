@@ -4,84 +4,151 @@ Server Management Bot Utilities
 Утилиты для обслуживания и диагностики бота
 """
 
+import concurrent.futures
+import functools
 import json
 import os
+import shutil
 import sqlite3
 import subprocess
 import sys
+import time
 from datetime import datetime, timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
 import paramiko
 from cryptography.fernet import Fernet
 
+# Быстрая сериализация JSON (необязательная зависимость)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Иконки типов событий журнала
+_EVENT_ICONS = {
+    'power_loss': '⚡',
+    'power_restore': '🔌',
+    'server_shutdown': '🔴',
+    'server_added': '➕',
+    'server_removed': '🗑️',
+    'test_shutdown': '🧪',
+    'error': '❌'
+}
+
+
+def _decrypt_password(cipher, encrypted_password):
+    """Расшифровка пароля сервера, None при ошибке"""
+    try:
+        return cipher.decrypt(encrypted_password.encode()).decode()
+    except Exception:
+        return None
+
 
 class BotDiagnostics:
     """Диагностика и обслуживание бота"""
     
+    # Максимум одновременных SSH-проверок и таймаут каждой стадии подключения
+    SSH_TEST_WORKERS = 32
+    SSH_TEST_TIMEOUT = 10
+    
     def __init__(self, db_path="servers.db"):
         self.db_path = db_path
         self.project_dir = Path(__file__).parent
+        self._conn = None
+    
+    @property
+    def conn(self):
+        """Общее подключение к базе, открывается при первом обращении"""
+        if self._conn is None:
+            # Транзакции управляются явно; база используется и работающим ботом
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA busy_timeout=5000')
+            conn.execute('PRAGMA cache_size=-65536')
+            self._conn = conn
+        return self._conn
+    
+    @functools.cached_property
+    def cipher(self):
+        """Шифр для паролей серверов (ключ читается один раз), None без ключа"""
+        try:
+            return Fernet(Path("encryption.key").read_bytes())
+        except FileNotFoundError:
+            return None
+    
+    def close(self):
+        """Закрытие подключения к базе"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
     
     def check_system_requirements(self):
         """Проверка системных требований"""
-        print("🔍 Checking system requirements...")
-        print("=" * 40)
+        # Отчет собирается целиком и выводится одной записью
+        out = ["🔍 Checking system requirements...", "=" * 40]
         
         # Проверка Termux
         is_termux = os.path.exists("/data/data/com.termux")
-        print(f"📱 Termux environment: {'✅' if is_termux else '❌'}")
+        out.append(f"📱 Termux environment: {'✅' if is_termux else '❌'}")
         
         # Проверка Python
         python_version = sys.version.split()[0]
-        print(f"🐍 Python version: {python_version}")
+        out.append(f"🐍 Python version: {python_version}")
         
         # Проверка пакетов
         required_packages = [
             "telegram", "paramiko", "cryptography", "schedule"
         ]
         
+        # Наличие пакета проверяется без его импорта и инициализации
         for package in required_packages:
-            try:
-                __import__(package)
-                print(f"📦 {package}: ✅")
-            except ImportError:
-                print(f"📦 {package}: ❌ (install with: pip install {package})")
+            if find_spec(package) is not None:
+                out.append(f"📦 {package}: ✅")
+            else:
+                out.append(f"📦 {package}: ❌ (install with: pip install {package})")
         
         # Проверка Termux API
         try:
-            result = subprocess.run(['which', 'termux-battery-status'], 
-                                  capture_output=True, text=True)
-            api_available = result.returncode == 0
-            print(f"🔋 Termux API: {'✅' if api_available else '❌'}")
+            # Поиск по PATH без запуска процесса
+            api_available = shutil.which('termux-battery-status') is not None
+            out.append(f"🔋 Termux API: {'✅' if api_available else '❌'}")
             
             if api_available:
                 # Тест батареи
                 try:
+                    # close_fds=False позволяет CPython запускать процесс через posix_spawn
                     result = subprocess.run(['termux-battery-status'], 
-                                          capture_output=True, text=True, timeout=5)
+                                          capture_output=True, text=True, timeout=5,
+                                          close_fds=False)
                     if result.returncode == 0:
                         battery_info = json.loads(result.stdout)
-                        print(f"   Battery: {battery_info.get('percentage', 'N/A')}% "
-                              f"({battery_info.get('status', 'Unknown')})")
+                        out.append(f"   Battery: {battery_info.get('percentage', 'N/A')}% "
+                                   f"({battery_info.get('status', 'Unknown')})")
                     else:
-                        print("   ⚠️ Battery status not accessible")
+                        out.append("   ⚠️ Battery status not accessible")
                 except Exception as e:
-                    print(f"   ⚠️ Battery test failed: {e}")
+                    out.append(f"   ⚠️ Battery test failed: {e}")
             
         except Exception as e:
-            print(f"🔋 Termux API: ❌ ({e})")
+            out.append(f"🔋 Termux API: ❌ ({e})")
         
         # Проверка файлов конфигурации
         config_files = ['.env', 'servers.db', 'encryption.key']
         for file in config_files:
             file_path = self.project_dir / file
             exists = file_path.exists()
-            print(f"📄 {file}: {'✅' if exists else '❌'}")
+            out.append(f"📄 {file}: {'✅' if exists else '❌'}")
             
             if exists:
                 size = file_path.stat().st_size
-                print(f"   Size: {size} bytes")
+                out.append(f"   Size: {size} bytes")
+        
+        print("\n".join(out))
     
     def backup_database(self, backup_dir="backups"):
         """Создание резервной копии базы данных"""
@@ -93,8 +160,7 @@ class BotDiagnostics:
         
         try:
             if Path(self.db_path).exists():
-                import shutil
-                shutil.copy2(self.db_path, backup_file)
+                self._backup_sqlite(self.db_path, backup_file)
                 print(f"✅ Database backup created: {backup_file}")
                 
                 # Также создаем JSON экспорт
@@ -109,69 +175,117 @@ class BotDiagnostics:
             print(f"❌ Backup failed: {e}")
             return None
     
+    # Сколько страниц копирует один шаг Online Backup API
+    BACKUP_PAGES_PER_STEP = 1024
+    
+    def _backup_sqlite(self, src, dst):
+        """Согласованный снимок базы через Online Backup API SQLite"""
+        try:
+            target = sqlite3.connect(str(dst))
+            try:
+                # Страницы копируются внутри SQLite под ее блокировками,
+                # поэтому запись работающего бота не порвет копию
+                self.conn.backup(target, pages=self.BACKUP_PAGES_PER_STEP)
+            finally:
+                target.close()
+        except sqlite3.Error as e:
+            # Поврежденный или не-SQLite файл копируется как есть
+            print(f"⚠️ SQLite backup failed ({e}), copying the file instead")
+            self._fast_copy(src, dst)
+    
+    # Размер блока копирования через sendfile
+    COPY_CHUNK_SIZE = 1 << 20
+    
+    def _fast_copy(self, src, dst):
+        """Копирование файла в ядре через sendfile с сохранением метаданных, как copy2"""
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                size = os.fstat(fsrc.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, self.COPY_CHUNK_SIZE)
+                    if sent == 0:
+                        break
+                    offset += sent
+        except (AttributeError, OSError):
+            # sendfile недоступен (Windows) или не поддерживается файловой системой
+            shutil.copyfile(src, dst)
+        shutil.copystat(src, dst)
+    
+    # Разделы экспорта: таблица и запрос к ней (пароли не выгружаются)
+    EXPORT_QUERIES = {
+        "servers": ("servers", "SELECT id, name, ip_address, port, username, key_path, shutdown_command, created_at FROM servers"),
+        "logs": ("event_logs", "SELECT event_type, message, server_name, status, timestamp FROM event_logs ORDER BY timestamp DESC LIMIT 50"),
+        "settings": ("settings", "SELECT key, value FROM settings")
+    }
+    
+    # Число строк, забираемых из курсора за один вызов
+    FETCH_BATCH_SIZE = 1000
+    
     def export_to_json(self, output_file):
         """Экспорт данных в JSON (без паролей)"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            # Таблица настроек может не существовать - проверка одним запросом
+            tables = {row[0] for row in self.conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'"
+            )}
             
-            export_data = {
-                "export_date": datetime.now().isoformat(),
-                "servers": [],
-                "logs": [],
-                "settings": []
-            }
-            
-            # Экспорт серверов (без паролей)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, name, ip_address, port, username, key_path, shutdown_command, created_at FROM servers")
-            for row in cursor.fetchall():
-                server = {
-                    "id": row[0],
-                    "name": row[1],
-                    "ip_address": row[2],
-                    "port": row[3],
-                    "username": row[4],
-                    "key_path": row[5],
-                    "shutdown_command": row[6],
-                    "created_at": row[7]
-                }
-                export_data["servers"].append(server)
-            
-            # Экспорт последних 50 логов
-            cursor.execute("SELECT event_type, message, server_name, status, timestamp FROM event_logs ORDER BY timestamp DESC LIMIT 50")
-            for row in cursor.fetchall():
-                log = {
-                    "event_type": row[0],
-                    "message": row[1],
-                    "server_name": row[2],
-                    "status": row[3],
-                    "timestamp": row[4]
-                }
-                export_data["logs"].append(log)
-            
-            # Экспорт настроек (если есть)
-            try:
-                cursor.execute("SELECT key, value FROM settings")
-                for row in cursor.fetchall():
-                    setting = {
-                        "key": row[0],
-                        "value": row[1]
-                    }
-                    export_data["settings"].append(setting)
-            except sqlite3.OperationalError:
-                pass  # Таблица настроек может не существовать
-            
-            conn.close()
+            fragments = {}
+            for section, (table, sql) in self.EXPORT_QUERIES.items():
+                if table not in tables:
+                    fragments[section] = b'[]'
+                    continue
+                # JSON формирует сам sqlite3, при его отсутствии - Python
+                fragment = self._query_json_cli(sql)
+                if fragment is None:
+                    fragment = self._query_json_python(sql)
+                fragments[section] = fragment
             
-            # Сохранение в JSON
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(export_data, f, indent=2, ensure_ascii=False)
+            # Готовые JSON-фрагменты вставляются в файл без повторного разбора
+            with open(output_file, 'wb') as f:
+                f.write(b'{\n  "export_date": ' + json.dumps(datetime.now().isoformat()).encode())
+                for section, fragment in fragments.items():
+                    f.write(b',\n  "' + section.encode() + b'": ' + fragment)
+                f.write(b'\n}\n')
             
             print(f"✅ JSON export created: {output_file}")
             
         except Exception as e:
             print(f"❌ JSON export failed: {e}")
     
+    def _query_json_cli(self, sql):
+        """Выборка в виде JSON через sqlite3 CLI; None, если CLI недоступен"""
+        sqlite_cli = shutil.which('sqlite3')
+        if sqlite_cli is None:
+            return None
+        try:
+            result = subprocess.run(
+                [sqlite_cli, '-readonly', self.db_path, '-cmd', '.mode json', sql],
+                capture_output=True, check=True, close_fds=False, timeout=30
+            )
+        except (OSError, subprocess.SubprocessError):
+            return None
+        
+        output = result.stdout.strip()
+        if not output:
+            return b'[]'  # Пустая выборка в режиме json ничего не выводит
+        # Старые версии sqlite3 без .mode json выводят строки в режиме list
+        if not output.startswith(b'['):
+            return None
+        return output
+    
+    def _query_json_python(self, sql):
+        """Выборка в виде JSON средствами Python"""
+        # Строки sqlite3.Row с именами колонок собираются в C, пачками
+        cursor = self.conn.execute(sql)
+        cursor.arraysize = self.FETCH_BATCH_SIZE
+        rows = []
+        while batch := cursor.fetchmany():
+            rows.extend(map(dict, batch))
+        if orjson is not None:
+            return orjson.dumps(rows, option=orjson.OPT_INDENT_2)
+        return json.dumps(rows, indent=2, ensure_ascii=False).encode()
+    
     def test_ssh_connections(self):
         """Тестирование всех SSH подключений"""
         print("🔗 Testing SSH connections...")
@@ -183,81 +297,114 @@ class BotDiagnostics:
         
         try:
             # Загрузка ключа шифрования
-            if Path("encryption.key").exists():
-                with open("encryption.key", "rb") as key_file:
-                    key = key_file.read()
-                cipher = Fernet(key)
-            else:
+            cipher = self.cipher
+            if cipher is None:
                 print("⚠️ Encryption key not found - passwords cannot be decrypted")
-                cipher = None
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM servers")
-            servers = cursor.fetchall()
-            conn.close()
+            servers = self.conn.execute(
+                "SELECT name, ip_address, port, username, password_encrypted, key_path FROM servers"
+            ).fetchall()
             
             if not servers:
                 print("ℹ️ No servers configured")
                 return
             
-            for server in servers:
-                name = server[1]
-                ip = server[2]
-                port = server[3]
-                username = server[4]
-                encrypted_password = server[5]
-                key_path = server[6]
-                
-                print(f"\n🖥️ Testing {name} ({ip}:{port})")
-                
-                try:
-                    client = paramiko.SSHClient()
-                    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                    
-                    # Подготовка аутентификации
-                    auth_kwargs = {
-                        'hostname': ip,
-                        'port': port,
-                        'username': username,
-                        'timeout': 10
-                    }
-                    
-                    if encrypted_password and cipher:
-                        try:
-                            password = cipher.decrypt(encrypted_password.encode()).decode()
-                            auth_kwargs['password'] = password
-                            print("   🔐 Using password authentication")
-                        except Exception:
-                            print("   ❌ Password decryption failed")
-                            continue
-                    elif key_path and Path(key_path).exists():
-                        auth_kwargs['key_filename'] = key_path
-                        print(f"   🔑 Using key authentication: {key_path}")
-                    else:
-                        print("   ❌ No valid authentication method")
-                        continue
-                    
-                    # Попытка подключения
-                    start_time = datetime.now()
-                    client.connect(**auth_kwargs)
-                    connection_time = (datetime.now() - start_time).total_seconds()
-                    
-                    # Тест команды
-                    stdin, stdout, stderr = client.exec_command('whoami')
-                    result = stdout.read().decode().strip()
-                    
-                    client.close()
-                    
-                    print(f"   ✅ Connection successful ({connection_time:.2f}s)")
-                    print(f"   👤 Remote user: {result}")
-                    
-                except Exception as e:
-                    print(f"   ❌ Connection failed: {e}")
+            # Все пароли расшифровываются одним проходом до подключений
+            passwords = [
+                _decrypt_password(cipher, server['password_encrypted'])
+                if server['password_encrypted'] and cipher else None
+                for server in servers
+            ]
+            
+            # Записи одного хоста с одинаковыми учетными данными проверяются
+            # через одно SSH подключение
+            groups = {}
+            for server, password in zip(servers, passwords):
+                key = (server['ip_address'], server['port'], server['username'],
+                       password, server['key_path'])
+                groups.setdefault(key, []).append(server)
+            
+            # Хосты проверяются параллельно, вывод печатается по порядку серверов
+            workers = min(len(groups), self.SSH_TEST_WORKERS)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                reports = executor.map(
+                    functools.partial(self._test_ssh_host, has_cipher=cipher is not None),
+                    groups.values(),
+                    [key[3] for key in groups]
+                )
+                results = {}
+                for group, group_lines in zip(groups.values(), reports):
+                    for server, lines in zip(group, group_lines):
+                        results[server['name']] = lines
+                for server in servers:
+                    print("\n".join(results[server['name']]))
             
         except Exception as e:
             print(f"❌ Test failed: {e}")
     
+    def _test_ssh_host(self, group, password, has_cipher=True):
+        """Проверка записей одного хоста с общими учетными данными,
+        возвращает строки отчета для каждой записи группы"""
+        reports = [[f"\n🖥️ Testing {name} ({ip}:{port})"]
+                   for name, ip, port, *_ in group]
+        _, ip, port, username, encrypted_password, key_path = group[0]
+        
+        def report(line):
+            for lines in reports:
+                lines.append(line)
+            return reports
+        
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            # Подготовка аутентификации
+            auth_kwargs = {
+                'hostname': ip,
+                'port': port,
+                'username': username,
+                'timeout': self.SSH_TEST_TIMEOUT,
+                'banner_timeout': self.SSH_TEST_TIMEOUT,
+                'auth_timeout': self.SSH_TEST_TIMEOUT
+            }
+            
+            if encrypted_password and has_cipher:
+                if password is None:
+                    return report("   ❌ Password decryption failed")
+                auth_kwargs['password'] = password
+                report("   🔐 Using password authentication")
+            elif key_path and Path(key_path).exists():
+                auth_kwargs['key_filename'] = key_path
+                report(f"   🔑 Using key authentication: {key_path}")
+            else:
+                return report("   ❌ No valid authentication method")
+            
+            # Попытка подключения
+            start_time = time.perf_counter()
+            client.connect(**auth_kwargs)
+            connection_time = time.perf_counter() - start_time
+        except Exception as e:
+            client.close()
+            return report(f"   ❌ Connection failed: {e}")
+        
+        # Тест команды: каждая запись получает свой канал поверх общего транспорта
+        try:
+            for index, lines in enumerate(reports):
+                try:
+                    stdin, stdout, stderr = client.exec_command('whoami', timeout=self.SSH_TEST_TIMEOUT)
+                    result = stdout.read().decode().strip()
+                except Exception as e:
+                    lines.append(f"   ❌ Connection failed: {e}")
+                    continue
+                if index == 0:
+                    lines.append(f"   ✅ Connection successful ({connection_time:.2f}s)")
+                else:
+                    lines.append("   ✅ Connection successful (reused)")
+                lines.append(f"   👤 Remote user: {result}")
+        finally:
+            client.close()
+        
+        return reports
+    
     def cleanup_logs(self, days_to_keep=30):
         """Очистка старых логов"""
         print(f"🧹 Cleaning up logs older than {days_to_keep} days...")
@@ -267,31 +414,38 @@ class BotDiagnostics:
             return
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Удаление старых записей
-            cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-            cursor.execute(
-                "DELETE FROM event_logs WHERE timestamp < ?",
-                (cutoff_date.isoformat(),)
-            )
+            if not self._has_epoch_column():
+                print(self.SCHEMA_OUTDATED)
+                return
+            cursor = self.conn.cursor()
             
-            deleted_count = cursor.rowcount
-            conn.commit()
-            conn.close()
+            # Удаление старых записей одной транзакцией с блокировкой записи сразу
+            cutoff_ts = int(time.time()) - days_to_keep * 86400
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute(
+                    "DELETE FROM event_logs WHERE ts_epoch < ?",
+                    (cutoff_ts,)
+                )
+                deleted_count = cursor.rowcount
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
             
             print(f"✅ Deleted {deleted_count} old log entries")
             
-            # Очистка файлов логов
-            logs_dir = Path("logs")
-            if logs_dir.exists():
+            # Очистка файлов логов (scandir отдает метаданные вместе с записями каталога)
+            if os.path.isdir("logs"):
                 deleted_files = 0
-                for log_file in logs_dir.glob("*.log"):
-                    file_age = datetime.now() - datetime.fromtimestamp(log_file.stat().st_mtime)
-                    if file_age.days > days_to_keep:
-                        log_file.unlink()
-                        deleted_files += 1
+                # Файл старше days_to_keep полных суток (как file_age.days > days_to_keep)
+                cutoff_ts = time.time() - (days_to_keep + 1) * 86400
+                with os.scandir("logs") as entries:
+                    for entry in entries:
+                        if (entry.name.endswith(".log") and entry.is_file()
+                                and entry.stat().st_mtime <= cutoff_ts):
+                            os.unlink(entry.path)
+                            deleted_files += 1
                 
                 print(f"✅ Deleted {deleted_files} old log files")
         
@@ -300,85 +454,100 @@ class BotDiagnostics:
     
     def show_statistics(self):
         """Показать статистику использования"""
-        print("📊 Bot Statistics")
-        print("=" * 40)
+        # Отчет собирается целиком и выводится одной записью
+        out = ["📊 Bot Statistics", "=" * 40]
         
         if not Path(self.db_path).exists():
-            print("❌ Database not found")
+            out.append("❌ Database not found")
+            print("\n".join(out))
             return
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Количество серверов
-            cursor.execute("SELECT COUNT(*) FROM servers")
-            server_count = cursor.fetchone()[0]
-            print(f"🖥️ Total servers: {server_count}")
+            if not self._has_epoch_column():
+                out.append(self.SCHEMA_OUTDATED)
+                print("\n".join(out))
+                return
+            cursor = self.conn.cursor()
             
-            # Статистика событий
+            # Вся статистика одним запросом: строки помечены разделом
+            thirty_days_ago = int(time.time()) - 30 * 86400
             cursor.execute("""
-                SELECT event_type, COUNT(*) as count 
+                SELECT 'servers', NULL, COUNT(*), NULL, NULL FROM servers
+                UNION ALL
+                SELECT 'types', event_type, COUNT(*), NULL, NULL
                 FROM event_logs 
-                GROUP BY event_type 
-                ORDER BY count DESC
-            """)
+                GROUP BY event_type
+                UNION ALL
+                SELECT * FROM (
+                    SELECT 'recent', event_type, NULL, message, timestamp 
+                    FROM event_logs 
+                    ORDER BY timestamp DESC 
+                    LIMIT 5
+                )
+                UNION ALL
+                SELECT 'last30', event_type, COUNT(*), NULL, NULL FROM event_logs 
+                WHERE ts_epoch > ? AND event_type IN ('power_loss', 'server_shutdown')
+                GROUP BY event_type
+            """, (thirty_days_ago,))
             
-            print("\n📋 Event statistics:")
-            for event_type, count in cursor.fetchall():
-                icon = self._get_event_icon(event_type)
-                print(f"   {icon} {event_type}: {count}")
+            server_count = 0
+            type_counts = []
+            recent_events = []
+            recent_counts = {}
+            for section, event_type, count, message, timestamp in cursor.fetchall():
+                if section == 'servers':
+                    server_count = count
+                elif section == 'types':
+                    type_counts.append((event_type, count))
+                elif section == 'recent':
+                    recent_events.append((event_type, message, timestamp))
+                else:
+                    recent_counts[event_type] = count
             
-            # Последние события
-            cursor.execute("""
-                SELECT event_type, message, timestamp 
-                FROM event_logs 
-                ORDER BY timestamp DESC 
-                LIMIT 5
-            """)
+            # Порядок строк внутри UNION ALL не гарантирован, сортируем здесь
+            type_counts.sort(key=lambda item: item[1], reverse=True)
+            recent_events.sort(key=lambda item: item[2], reverse=True)
+            
+            # Количество серверов
+            out.append(f"🖥️ Total servers: {server_count}")
             
-            print("\n🕐 Recent events:")
-            for event_type, message, timestamp in cursor.fetchall():
-                icon = self._get_event_icon(event_type)
+            # Статистика событий
+            out.append("\n📋 Event statistics:")
+            for event_type, count in type_counts:
+                icon = _EVENT_ICONS.get(event_type, '📝')
+                out.append(f"   {icon} {event_type}: {count}")
+            
+            # Последние события
+            out.append("\n🕐 Recent events:")
+            for event_type, message, timestamp in recent_events:
+                icon = _EVENT_ICONS.get(event_type, '📝')
                 dt = datetime.fromisoformat(timestamp)
                 formatted_time = dt.strftime("%d.%m %H:%M")
-                print(f"   {icon} {formatted_time}: {message}")
+                out.append(f"   {icon} {formatted_time}: {message}")
             
             # Статистика за последние 30 дней
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            cursor.execute("""
-                SELECT COUNT(*) FROM event_logs 
-                WHERE timestamp > ? AND event_type = 'power_loss'
-            """, (thirty_days_ago.isoformat(),))
-            
-            power_losses = cursor.fetchone()[0]
-            print(f"\n⚡ Power losses (30 days): {power_losses}")
-            
-            cursor.execute("""
-                SELECT COUNT(*) FROM event_logs 
-                WHERE timestamp > ? AND event_type = 'server_shutdown'
-            """, (thirty_days_ago.isoformat(),))
-            
-            shutdowns = cursor.fetchone()[0]
-            print(f"🔴 Server shutdowns (30 days): {shutdowns}")
+            power_losses = recent_counts.get('power_loss', 0)
+            out.append(f"\n⚡ Power losses (30 days): {power_losses}")
             
-            conn.close()
+            shutdowns = recent_counts.get('server_shutdown', 0)
+            out.append(f"🔴 Server shutdowns (30 days): {shutdowns}")
             
         except Exception as e:
-            print(f"❌ Statistics failed: {e}")
+            out.append(f"❌ Statistics failed: {e}")
+        
+        print("\n".join(out))
+    
+    # Сообщение для базы, которую еще не обновил бот
+    SCHEMA_OUTDATED = "⚠️ Event log schema is outdated - start the bot once to upgrade it"
+    
+    def _has_epoch_column(self):
+        """Есть ли в журнале колонка ts_epoch (ее создает и заполняет бот)"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(event_logs)')}
+        return 'ts_epoch' in columns
     
     def _get_event_icon(self, event_type):
         """Получить иконку для типа события"""
-        icons = {
-            'power_loss': '⚡',
-            'power_restore': '🔌',
-            'server_shutdown': '🔴',
-            'server_added': '➕',
-            'server_removed': '🗑️',
-            'test_shutdown': '🧪',
-            'error': '❌'
-        }
-        return icons.get(event_type, '📝')
+        return _EVENT_ICONS.get(event_type, '📝')
     
     def interactive_menu(self):
         """Интерактивное меню"""
@@ -431,32 +600,34 @@ class BotDiagnostics:
 
 def main():
     """Главная функция"""
-    if len(sys.argv) > 1:
-        # Режим командной строки
-        diagnostics = BotDiagnostics()
-        command = sys.argv[1].lower()
-        
-        if command == "check":
-            diagnostics.check_system_requirements()
-        elif command == "backup":
-            diagnostics.backup_database()
-        elif command == "test":
-            diagnostics.test_ssh_connections()
-        elif command == "cleanup":
-            days = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 30
-            diagnostics.cleanup_logs(days)
-        elif command == "stats":
-            diagnostics.show_statistics()
-        elif command == "export":
-            filename = sys.argv[2] if len(sys.argv) > 2 else "export.json"
-            diagnostics.export_to_json(filename)
+    diagnostics = BotDiagnostics()
+    try:
+        if len(sys.argv) > 1:
+            # Режим командной строки
+            command = sys.argv[1].lower()
+            
+            if command == "check":
+                diagnostics.check_system_requirements()
+            elif command == "backup":
+                diagnostics.backup_database()
+            elif command == "test":
+                diagnostics.test_ssh_connections()
+            elif command == "cleanup":
+                days = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 30
+                diagnostics.cleanup_logs(days)
+            elif command == "stats":
+                diagnostics.show_statistics()
+            elif command == "export":
+                filename = sys.argv[2] if len(sys.argv) > 2 else "export.json"
+                diagnostics.export_to_json(filename)
+            else:
+                print("Usage: python bot_utils.py [check|backup|test|cleanup|stats|export]")
+                print("Or run without arguments for interactive menu")
         else:
-            print("Usage: python bot_utils.py [check|backup|test|cleanup|stats|export]")
-            print("Or run without arguments for interactive menu")
-    else:
-        # Интерактивный режим
-        diagnostics = BotDiagnostics()
-        diagnostics.interactive_menu()
+            # Интерактивный режим
+            diagnostics.interactive_menu()
+    finally:
+        diagnostics.close()
 
 
 if __name__ == "__main__":
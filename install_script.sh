@@ -110,6 +110,18 @@ BOT_TOKEN=your_bot_token_here
 # Your Telegram username (without @)
 ALLOWED_USER=mgmwm
 
+# Optional: Your numeric Telegram user ID (checked instead of the username)
+# ALLOWED_USER_ID=123456789
+
+# Optional: Webhook mode instead of long polling (needs a public HTTPS URL,
+# e.g. a reverse proxy forwarding to WEBHOOK_LISTEN:WEBHOOK_PORT)
+# WEBHOOK_URL=https://your.domain/path
+# WEBHOOK_LISTEN=127.0.0.1
+# WEBHOOK_PORT=8443
+# WEBHOOK_SECRET=random_secret_token
+# Local path to serve if the proxy rewrites it (defaults to the WEBHOOK_URL path)
+# WEBHOOK_PATH=/path
+
 # Optional: Custom database path
 # DB_PATH=servers.db
 
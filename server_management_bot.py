@@ -5,22 +5,43 @@ Designed for Termux on Android
 """
 
 import asyncio
-import json
+import collections
+import concurrent.futures
+import functools
 import logging
 import os
+import queue
+import select
+import shutil
+import socket
 import sqlite3
 import subprocess
 import threading
 import time
+import urllib.parse
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 import paramiko
 import schedule
 from cryptography.fernet import Fernet
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.error import RetryAfter
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 
+# Быстрый разбор JSON (необязательная зависимость)
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+# Быстрая реализация Fernet на Rust (необязательная зависимость)
+try:
+    from rfernet import Fernet as RustFernet
+except ImportError:
+    RustFernet = None
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -32,77 +53,251 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Интервал обслуживания базы данных (секунды)
+DB_MAINTENANCE_INTERVAL = 6 * 60 * 60
+
+# Шаблоны сообщений
+_POWER_LOSS_FMT = (
+    "🚨 *ОТКЛЮЧЕНИЕ ЭЛЕКТРОПИТАНИЯ!*\n\n"
+    "⚡ Обнаружено отключение от сети\n"
+    "🕐 Время: {ts}\n\n"
+    "🔄 Начинаю безопасное отключение серверов..."
+)
+_POWER_RESTORE_FMT = (
+    "🔌 *ПИТАНИЕ ВОССТАНОВЛЕНО*\n\n"
+    "✅ Подключение к электросети восстановлено\n"
+    "🕐 Время восстановления: {ts}\n"
+    "{duration}\n\n"
+    "ℹ️ Серверы могут потребовать ручного запуска"
+)
+_POWER_REMINDER_FMT = (
+    "⚠️ *НАПОМИНАНИЕ: ПИТАНИЕ ВСЕ ЕЩЕ ОТКЛЮЧЕНО*\n\n"
+    "⏱️ Прошло времени: {hours:02d}:{minutes:02d}\n"
+    "🕐 Время: {ts}\n\n"
+    "🔋 Устройство работает от батареи"
+)
+_SETTINGS_FMT = (
+    "⚙️ *Настройки бота*\n\n"
+    "🔍 Мониторинг питания: {monitoring}\n"
+    "⚡ Текущее состояние: {charging}\n"
+    "👤 Авторизованный пользователь: @{username}\n"
+    "📂 База данных: {database}\n"
+    "🔐 Шифрование: {encryption}\n\n"
+    "📊 Серверов в базе: {server_count}\n"
+)
+_STATUS_HDR = "📊 *Статус системы*\n\n"
+_STATUS_ROW_FMT = "{icon} {name} ({ip})\n"
+_LIST_HDR = "📋 *Список серверов*\n\n"
+_LIST_ROW_FMT = (
+    "{icon} *{name}*\n"
+    "   📍 {ip}:{port}\n"
+    "   👤 {user}\n"
+    "   📅 {created}\n\n"
+)
+_SERVERS_MENU_TEXT = "🖥️ *Управление серверами*\n\nВыберите действие:"
+
 class DatabaseManager:
     """Менеджер базы данных для хранения серверов и настроек"""
     
+    # Параметры пакетной записи журнала событий
+    LOG_FLUSH_INTERVAL = 0.1
+    LOG_BATCH_SIZE = 32
+    # Сколько последних событий хранить при обслуживании базы
+    LOG_RETENTION = 10000
+    
     def __init__(self, db_path: str = "servers.db"):
         self.db_path = db_path
+        # Одно долгоживущее подключение на весь процесс: обработчики бота и
+        # поток мониторинга питания работают через него под блокировкой
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, cached_statements=256
+        )
+        # Строки доступны по имени колонки без сборки словарей
+        self._conn.row_factory = sqlite3.Row
+        self._configure_connection()
         self.init_database()
+        self.crypto = get_crypto()
+        # Кэш списка серверов, действителен пока не изменилась версия списка
+        self._servers_version = 0
+        self._servers_cache: Optional[Tuple[int, List[sqlite3.Row]]] = None
+        
+        # Очередь событий журнала: запись выполняется пакетами в фоновом потоке
+        self._log_queue = queue.SimpleQueue()
+        self._log_flusher = threading.Thread(target=self._flush_logs_loop, daemon=True)
+        self._log_flusher.start()
+    
+    def _configure_connection(self):
+        """Настройка параметров SQLite для подключения"""
+        with self._lock:
+            # auto_vacuum включается только в новой базе, до создания таблиц и WAL
+            if self._conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0] == 0:
+                self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA busy_timeout=5000')
+            self._conn.execute('PRAGMA cache_size=-65536')
+            # Временные таблицы и индексы в памяти, чтение базы через mmap (64 МБ)
+            self._conn.execute('PRAGMA temp_store=MEMORY')
+            self._conn.execute('PRAGMA mmap_size=67108864')
     
     def init_database(self):
         """Инициализация базы данных"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Таблица серверов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS servers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                ip_address TEXT NOT NULL,
-                port INTEGER DEFAULT 22,
-                username TEXT NOT NULL,
-                password_encrypted TEXT,
-                key_path TEXT,
-                shutdown_command TEXT DEFAULT 'sudo shutdown -h now',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        with self._lock:
+            cursor = self._conn.cursor()
+            
+            # Таблица серверов
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS servers (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    ip_address TEXT NOT NULL,
+                    port INTEGER DEFAULT 22,
+                    username TEXT NOT NULL,
+                    password_encrypted TEXT,
+                    key_path TEXT,
+                    shutdown_command TEXT DEFAULT 'sudo shutdown -h now',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Таблица настроек
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS settings (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Таблица логов
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS event_logs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_type TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    server_name TEXT,
+                    status TEXT,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    ts_epoch INTEGER
+                )
+            ''')
+            
+            # Время события в секундах UTC для выборок по периоду; в базах,
+            # созданных до появления колонки, она заполняется один раз
+            columns = {row[1] for row in cursor.execute('PRAGMA table_info(event_logs)')}
+            if 'ts_epoch' not in columns:
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    cursor.execute('ALTER TABLE event_logs ADD COLUMN ts_epoch INTEGER')
+                    cursor.execute(
+                        "UPDATE event_logs SET ts_epoch = CAST(strftime('%s', timestamp) AS INTEGER)"
+                    )
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+            
+            # Триггер и индексы по текстовому времени, которые создавали
+            # прежние версии утилиты диагностики
+            cursor.execute('DROP TRIGGER IF EXISTS trg_event_logs_ts_epoch')
+            cursor.execute('DROP INDEX IF EXISTS idx_logs_ts_type')
+            cursor.execute('DROP INDEX IF EXISTS idx_logs_type_ts')
+            
+            # Индекс для выборки последних событий без сортировки всей таблицы
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_event_logs_ts ON event_logs(timestamp DESC)'
             )
-        ''')
-        
-        # Таблица настроек
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            # Индексы для очистки и статистики по периоду
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_logs_ts_epoch ON event_logs(ts_epoch)'
             )
-        ''')
-        
-        # Таблица логов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS event_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_type TEXT NOT NULL,
-                message TEXT NOT NULL,
-                server_name TEXT,
-                status TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_logs_type_epoch ON event_logs(event_type, ts_epoch)'
             )
-        ''')
-        
-        conn.commit()
-        conn.close()
+    
+    def close(self):
+        """Закрытие подключения к базе данных"""
+        self._log_queue.put(None)
+        self._log_flusher.join(timeout=5)
+        self._flush_logs()
+        with self._lock:
+            self._conn.close()
+    
+    def _flush_logs_loop(self):
+        """Фоновая запись событий журнала пакетами"""
+        while True:
+            item = self._log_queue.get()
+            if item is None:
+                return
+            
+            rows = [item]
+            deadline = time.monotonic() + self.LOG_FLUSH_INTERVAL
+            stop = False
+            while len(rows) < self.LOG_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._log_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                rows.append(item)
+            
+            self._write_logs(rows)
+            if stop:
+                return
+    
+    def _flush_logs(self):
+        """Немедленная запись всех ожидающих событий журнала"""
+        rows = []
+        while True:
+            try:
+                item = self._log_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                rows.append(item)
+        if rows:
+            self._write_logs(rows)
+    
+    def _write_logs(self, rows: List[Tuple]):
+        """Запись пакета событий одной транзакцией"""
+        try:
+            with self._lock:
+                self._conn.execute('BEGIN')
+                try:
+                    self._conn.executemany('''
+                        INSERT INTO event_logs (event_type, message, server_name, status, timestamp, ts_epoch)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                    self._conn.execute('COMMIT')
+                except Exception:
+                    self._conn.execute('ROLLBACK')
+                    raise
+        except Exception as e:
+            logger.error(f"Error logging events: {e}")
     
     def add_server(self, name: str, ip: str, port: int, username: str, 
                    password: str = None, key_path: str = None, 
                    shutdown_command: str = 'sudo shutdown -h now') -> bool:
         """Добавление сервера"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
             encrypted_password = None
             if password:
-                encrypted_password = CryptoManager().encrypt(password)
+                encrypted_password = self.crypto.encrypt(password)
             
-            cursor.execute('''
-                INSERT INTO servers (name, ip_address, port, username, password_encrypted, key_path, shutdown_command)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (name, ip, port, username, encrypted_password, key_path, shutdown_command))
+            with self._lock:
+                self._conn.execute('''
+                    INSERT INTO servers (name, ip_address, port, username, password_encrypted, key_path, shutdown_command)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (name, ip, port, username, encrypted_password, key_path, shutdown_command))
+                self._servers_version += 1
             
-            conn.commit()
-            conn.close()
             return True
         except sqlite3.IntegrityError:
             return False
@@ -110,44 +305,47 @@ class DatabaseManager:
             logger.error(f"Error adding server: {e}")
             return False
     
-    def get_servers(self) -> List[Dict]:
-        """Получение списка серверов"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM servers')
-        rows = cursor.fetchall()
-        conn.close()
-        
-        servers = []
-        for row in rows:
-            server = {
-                'id': row[0],
-                'name': row[1],
-                'ip_address': row[2],
-                'port': row[3],
-                'username': row[4],
-                'password_encrypted': row[5],
-                'key_path': row[6],
-                'shutdown_command': row[7],
-                'created_at': row[8],
-                'updated_at': row[9]
-            }
-            servers.append(server)
-        
-        return servers
+    def get_servers(self, limit: Optional[int] = None, offset: int = 0) -> List[sqlite3.Row]:
+        """Получение списка серверов (из кэша, если список не менялся)"""
+        with self._lock:
+            cached = self._servers_cache
+            if cached is not None and cached[0] == self._servers_version:
+                servers = cached[1]
+                if limit is None:
+                    return servers[offset:] if offset else servers
+                return servers[offset:offset + limit]
+            
+            # Страница читается из базы напрямую, без загрузки всей таблицы
+            if limit is not None:
+                return self._conn.execute(
+                    'SELECT * FROM servers ORDER BY id LIMIT ? OFFSET ?', (limit, offset)
+                ).fetchall()
+            
+            servers = self._conn.execute('SELECT * FROM servers ORDER BY id').fetchall()
+            self._servers_cache = (self._servers_version, servers)
+            return servers[offset:] if offset else servers
+    
+    @property
+    def servers_version(self) -> int:
+        """Версия списка серверов, увеличивается при каждом изменении"""
+        return self._servers_version
+    
+    def get_server_count(self) -> int:
+        """Количество серверов"""
+        with self._lock:
+            cached = self._servers_cache
+            if cached is not None and cached[0] == self._servers_version:
+                return len(cached[1])
+            return self._conn.execute('SELECT COUNT(*) FROM servers').fetchone()[0]
     
     def remove_server(self, server_name: str) -> bool:
         """Удаление сервера"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM servers WHERE name = ?', (server_name,))
-            affected_rows = cursor.rowcount
-            
-            conn.commit()
-            conn.close()
+            with self._lock:
+                cursor = self._conn.execute('DELETE FROM servers WHERE name = ?', (server_name,))
+                affected_rows = cursor.rowcount
+                if affected_rows:
+                    self._servers_version += 1
             
             return affected_rows > 0
         except Exception as e:
@@ -155,48 +353,36 @@ class DatabaseManager:
             return False
     
     def log_event(self, event_type: str, message: str, server_name: str = None, status: str = None):
-        """Логирование событий"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO event_logs (event_type, message, server_name, status)
-                VALUES (?, ?, ?, ?)
-            ''', (event_type, message, server_name, status))
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error logging event: {e}")
+        """Логирование событий (запись выполняется в фоне)"""
+        # Время фиксируется в момент события в формате CURRENT_TIMESTAMP (UTC)
+        # и в секундах UTC, а не в момент записи пакета
+        ts_epoch = int(time.time())
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts_epoch))
+        self._log_queue.put((event_type, message, server_name, status, timestamp, ts_epoch))
     
-    def get_recent_logs(self, limit: int = 20) -> List[Dict]:
+    def get_recent_logs(self, limit: int = 20) -> List[sqlite3.Row]:
         """Получение последних логов"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM event_logs 
-            ORDER BY timestamp DESC 
-            LIMIT ?
-        ''', (limit,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        logs = []
-        for row in rows:
-            log = {
-                'id': row[0],
-                'event_type': row[1],
-                'message': row[2],
-                'server_name': row[3],
-                'status': row[4],
-                'timestamp': row[5]
-            }
-            logs.append(log)
-        
-        return logs
+        self._flush_logs()
+        with self._lock:
+            return self._conn.execute('''
+                SELECT * FROM event_logs 
+                ORDER BY timestamp DESC 
+                LIMIT ?
+            ''', (limit,)).fetchall()
+    
+    def trim_logs(self, keep: int = LOG_RETENTION) -> int:
+        """Удаление старых событий сверх лимита и освобождение места"""
+        self._flush_logs()
+        with self._lock:
+            cursor = self._conn.execute('''
+                DELETE FROM event_logs WHERE id NOT IN (
+                    SELECT id FROM event_logs ORDER BY timestamp DESC LIMIT ?
+                )
+            ''', (keep,))
+            deleted = cursor.rowcount
+            # execute() делает один шаг прагмы (одна страница), executescript - все
+            self._conn.executescript('PRAGMA incremental_vacuum(1000);')
+        return deleted
 
 class CryptoManager:
     """Менеджер шифрования для защиты чувствительных данных"""
@@ -204,7 +390,12 @@ class CryptoManager:
     def __init__(self):
         self.key_file = "encryption.key"
         self.key = self._load_or_generate_key()
-        self.cipher = Fernet(self.key)
+        # rfernet совместим по формату токенов, но работает со строками
+        self._rust_backend = RustFernet is not None
+        if self._rust_backend:
+            self.cipher = RustFernet(self.key.decode())
+        else:
+            self.cipher = Fernet(self.key)
     
     def _load_or_generate_key(self) -> bytes:
         """Загрузка или генерация ключа шифрования"""
@@ -219,39 +410,102 @@ class CryptoManager:
     
     def encrypt(self, data: str) -> str:
         """Шифрование данных"""
+        if self._rust_backend:
+            return self.cipher.encrypt(data.encode())
         encrypted_data = self.cipher.encrypt(data.encode())
         return encrypted_data.decode()
     
+    @functools.lru_cache(maxsize=128)
     def decrypt(self, encrypted_data: str) -> str:
-        """Расшифровка данных"""
+        """Расшифровка данных (результат кэшируется по шифротексту)"""
+        if self._rust_backend:
+            return self.cipher.decrypt(encrypted_data).decode()
         decrypted_data = self.cipher.decrypt(encrypted_data.encode())
         return decrypted_data.decode()
 
+@functools.cache
+def get_crypto() -> CryptoManager:
+    """Общий экземпляр менеджера шифрования"""
+    return CryptoManager()
+
 class PowerMonitor:
     """Монитор питания для Android/Termux"""
     
+    BATTERY_STATUS_PATH = '/sys/class/power_supply/battery/status'
+    # Интервал опроса без событий ядра и максимальное ожидание события,
+    # когда драйвер уже доказал, что отправляет уведомления
+    POLL_INTERVAL = 2
+    EVENT_WAIT_TIMEOUT = 30
+    
     def __init__(self, bot_instance):
         self.bot = bot_instance
         self.is_monitoring = False
+        self._status_fd, self._epoll = self._open_status_watch()
+        # Многие драйверы power_supply шлют только uevent без sysfs_notify,
+        # поэтому до первого события ядра ожидание не длиннее интервала опроса
+        self._events_confirmed = False
         self.is_charging = self._get_charging_status()
         self.last_power_loss_time = None
-        self.notification_thread = None
-        self.monitor_thread = None
+        self.notification_task = None
+        self.monitor_task = None
+    
+    def _open_status_watch(self) -> Tuple[Optional[int], Optional["select.epoll"]]:
+        """Подготовка ожидания изменений статуса батареи через sysfs"""
+        try:
+            fd = os.open(self.BATTERY_STATUS_PATH, os.O_RDONLY)
+        except OSError:
+            return None, None
+        
+        try:
+            epoll = select.epoll()
+            epoll.register(fd, select.EPOLLPRI | select.EPOLLERR)
+        except (AttributeError, OSError):
+            epoll = None
+        return fd, epoll
+    
+    def _read_status_fd(self) -> bool:
+        """Чтение статуса зарядки из открытого файла sysfs"""
+        status = os.pread(self._status_fd, 32, 0).decode().strip()
+        # "Full" и "Not charging" означают, что зарядное устройство подключено
+        return status != 'Discharging'
+    
+    async def _wait_for_status_change(self) -> bool:
+        """Ожидание изменения статуса, возвращает True при событии ядра"""
+        if self._epoll is None:
+            await asyncio.sleep(self.POLL_INTERVAL)
+            return False
+        
+        # Дескриптор epoll становится читаемым, когда ядро сообщает об изменении
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        loop.add_reader(self._epoll.fileno(), ready.set)
+        timeout = self.EVENT_WAIT_TIMEOUT if self._events_confirmed else self.POLL_INTERVAL
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(self._epoll.fileno())
+        if self._epoll.poll(0):
+            self._events_confirmed = True
+            return True
+        return False
     
     def _get_charging_status(self) -> bool:
         """Получение статуса зарядки на Android"""
         try:
-            # Использование Termux API для получения статуса батареи
+            # Чтение из sysfs через уже открытый дескриптор, без запуска процессов
+            if self._status_fd is not None:
+                return self._read_status_fd()
+            
+            # Fallback через Termux API, если sysfs недоступен
             result = subprocess.run(['termux-battery-status'], 
                                   capture_output=True, text=True, timeout=5)
-            if result.returncode == 0:
-                battery_info = json.loads(result.stdout)
-                return battery_info.get('plugged', 'UNPLUGGED') != 'UNPLUGGED'
-            else:
-                # Fallback метод через /sys/class/power_supply
-                with open('/sys/class/power_supply/battery/status', 'r') as f:
-                    status = f.read().strip()
-                return status == 'Charging'
+            if result.returncode != 0:
+                logger.error(f"termux-battery-status failed: {result.stderr.strip()}")
+                return True
+            battery_info = _json.loads(result.stdout)
+            return battery_info.get('plugged', 'UNPLUGGED') != 'UNPLUGGED'
         except Exception as e:
             logger.error(f"Error getting charging status: {e}")
             return True  # Предполагаем подключение к питанию при ошибке
@@ -262,106 +516,239 @@ class PowerMonitor:
             return
         
         self.is_monitoring = True
-        self.monitor_thread = threading.Thread(target=self._monitor_power, daemon=True)
-        self.monitor_thread.start()
+        self.monitor_task = asyncio.create_task(self._monitor_power())
         logger.info("Power monitoring started")
     
     def stop_monitoring(self):
         """Остановка мониторинга питания"""
         self.is_monitoring = False
-        if self.notification_thread and self.notification_thread.is_alive():
-            self.notification_thread.join(timeout=1)
+        for task in (self.monitor_task, self.notification_task):
+            if task and not task.done():
+                task.cancel()
     
-    def _monitor_power(self):
+    async def _monitor_power(self):
         """Основной цикл мониторинга питания"""
+        notified = True
         while self.is_monitoring:
             try:
-                current_charging = self._get_charging_status()
+                if self._status_fd is not None:
+                    current_charging = self._get_charging_status()
+                else:
+                    current_charging = await asyncio.to_thread(self._get_charging_status)
+                
+                if self._epoll is not None and not notified and current_charging != self.is_charging:
+                    # Драйвер не отправляет уведомления - переходим на опрос
+                    logger.info("Battery status events unavailable, falling back to polling")
+                    self._epoll.close()
+                    self._epoll = None
                 
                 if self.is_charging and not current_charging:
                     # Питание отключено
                     logger.warning("Power loss detected!")
+                    self.is_charging = current_charging
                     self.last_power_loss_time = datetime.now()
-                    asyncio.run_coroutine_threadsafe(
-                        self.bot.handle_power_loss(), 
-                        self.bot.application.loop
-                    )
                     self._start_notification_cycle()
+                    await self.bot.handle_power_loss()
                 
                 elif not self.is_charging and current_charging:
                     # Питание восстановлено
                     logger.info("Power restored!")
-                    asyncio.run_coroutine_threadsafe(
-                        self.bot.handle_power_restore(), 
-                        self.bot.application.loop
-                    )
+                    self.is_charging = current_charging
                     self._stop_notification_cycle()
+                    await self.bot.handle_power_restore()
                 
-                self.is_charging = current_charging
-                time.sleep(2)  # Проверка каждые 2 секунды
+                notified = await self._wait_for_status_change()
                 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Error in power monitoring: {e}")
-                time.sleep(5)
+                await asyncio.sleep(5)
     
     def _start_notification_cycle(self):
         """Запуск цикла уведомлений каждые 5 минут"""
-        if self.notification_thread and self.notification_thread.is_alive():
+        if self.notification_task and not self.notification_task.done():
             return
         
-        self.notification_thread = threading.Thread(
-            target=self._notification_cycle, daemon=True
-        )
-        self.notification_thread.start()
+        self.notification_task = asyncio.create_task(self._notification_cycle())
     
     def _stop_notification_cycle(self):
         """Остановка цикла уведомлений"""
-        # Поток завершится сам при восстановлении питания
-        pass
+        if self.notification_task and not self.notification_task.done():
+            self.notification_task.cancel()
     
-    def _notification_cycle(self):
+    async def _notification_cycle(self):
         """Цикл периодических уведомлений"""
         while not self.is_charging and self.is_monitoring:
-            time.sleep(300)  # 5 минут
+            await asyncio.sleep(300)  # 5 минут
             if not self.is_charging:  # Проверяем еще раз
                 elapsed = datetime.now() - self.last_power_loss_time
-                asyncio.run_coroutine_threadsafe(
-                    self.bot.send_power_reminder(elapsed), 
-                    self.bot.application.loop
-                )
+                await self.bot.send_power_reminder(elapsed)
+
+# Ключ пула SSH: хост, порт, пользователь и учетные данные (шифртекст пароля, путь к ключу)
+_PoolKey = Tuple[str, int, str, Optional[str], Optional[str]]
 
 class SSHManager:
     """Менеджер SSH-подключений для управления серверами"""
     
+    # Таймаут TCP-подключения, SSH-баннера и аутентификации (секунды)
+    CONNECT_TIMEOUT = 3
+    # Интервал keepalive для подключений в пуле (секунды)
+    KEEPALIVE_INTERVAL = 30
+    # Таймаут проверки доступности SSH-порта (секунды)
+    PORT_CHECK_TIMEOUT = 1.0
+    # Ограничение одновременных сессий на одно подключение (MaxSessions в sshd)
+    MAX_SESSIONS_PER_HOST = 5
+    # Максимум одновременных SSH-операций
+    MAX_WORKERS = 16
+    # Время, за которое команда отключения должна сообщить об ошибке
+    SHUTDOWN_GRACE_PERIOD = 0.5
+    
     def __init__(self):
-        self.crypto = CryptoManager()
+        self.crypto = get_crypto()
+        # Пул аутентифицированных подключений; подключение используется
+        # повторно только с теми же учетными данными, с которыми оно открыто
+        self._pool: Dict[_PoolKey, paramiko.SSHClient] = {}
+        self._pool_lock = threading.Lock()
+        self._session_slots: Dict[_PoolKey, threading.BoundedSemaphore] = {}
+        # Блокирующие вызовы paramiko выполняются в общем пуле потоков
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.MAX_WORKERS, thread_name_prefix="ssh"
+        )
+    
+    @staticmethod
+    def _pool_key(server: Dict) -> _PoolKey:
+        """Ключ пула подключений для сервера"""
+        return (server['ip_address'], server['port'], server['username'],
+                server['password_encrypted'], server['key_path'])
+    
+    def _auth_kwargs(self, server: Dict) -> Optional[Dict]:
+        """Параметры аутентификации для сервера или None, если метода нет"""
+        key_path = server['key_path']
+        if not server['password_encrypted'] and not (key_path and os.path.exists(key_path)):
+            return None
+        return self._build_auth_kwargs(
+            server['ip_address'], server['port'], server['username'],
+            server['password_encrypted'], key_path
+        )
+    
+    @functools.lru_cache(maxsize=64)
+    def _build_auth_kwargs(self, host: str, port: int, username: str,
+                           password_encrypted: Optional[str], key_path: Optional[str]) -> Dict:
+        """Сборка параметров подключения (кэшируется, словарь не изменять)"""
+        # Подготовка аутентификации
+        auth_kwargs = {
+            'hostname': host,
+            'port': port,
+            'username': username
+        }
+        
+        if password_encrypted:
+            auth_kwargs['password'] = self.crypto.decrypt(password_encrypted)
+        else:
+            auth_kwargs['key_filename'] = key_path
+        return auth_kwargs
+    
+    def _acquire(self, server: Dict) -> Optional[paramiko.SSHClient]:
+        """Получение подключения из пула или создание нового"""
+        key = self._pool_key(server)
+        
+        with self._pool_lock:
+            client = self._pool.get(key)
+        if client is not None:
+            transport = client.get_transport()
+            if transport is not None and transport.is_active():
+                return client
+            self._invalidate(key)
+        
+        client = self._connect(server)
+        if client is None:
+            return None
+        client.get_transport().set_keepalive(self.KEEPALIVE_INTERVAL)
+        
+        with self._pool_lock:
+            pooled = self._pool.setdefault(key, client)
+        if pooled is not client:
+            # Параллельный вызов успел добавить подключение раньше
+            client.close()
+        return pooled
+    
+    def _connect(self, server: Dict) -> Optional[paramiko.SSHClient]:
+        """Новое подключение к серверу вне пула или None, если нет метода аутентификации"""
+        auth_kwargs = self._auth_kwargs(server)
+        if auth_kwargs is None:
+            return None
+        
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            client.connect(
+                **auth_kwargs,
+                timeout=self.CONNECT_TIMEOUT,
+                banner_timeout=self.CONNECT_TIMEOUT,
+                auth_timeout=self.CONNECT_TIMEOUT
+            )
+        except Exception:
+            client.close()
+            raise
+        return client
+    
+    def _session_slot(self, key: _PoolKey) -> threading.BoundedSemaphore:
+        """Семафор, ограничивающий число открытых сессий на подключении"""
+        with self._pool_lock:
+            slot = self._session_slots.get(key)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.MAX_SESSIONS_PER_HOST)
+                self._session_slots[key] = slot
+            return slot
+    
+    def _invalidate(self, key: _PoolKey):
+        """Удаление подключения из пула"""
+        with self._pool_lock:
+            client = self._pool.pop(key, None)
+        if client is not None:
+            client.close()
+    
+    def evict(self, server: Dict):
+        """Закрытие подключения удаленного сервера и освобождение его слотов"""
+        key = self._pool_key(server)
+        self._invalidate(key)
+        with self._pool_lock:
+            self._session_slots.pop(key, None)
+    
+    def close_all(self):
+        """Закрытие всех подключений пула"""
+        self._executor.shutdown(wait=False)
+        with self._pool_lock:
+            clients = list(self._pool.values())
+            self._pool.clear()
+        for client in clients:
+            client.close()
+    
+    def is_port_open(self, server: Dict) -> Tuple[bool, str]:
+        """Быстрая проверка доступности SSH-порта без рукопожатия и аутентификации"""
+        try:
+            with socket.create_connection((server['ip_address'], server['port']),
+                                          timeout=self.PORT_CHECK_TIMEOUT):
+                return True, "Port open"
+        except OSError as e:
+            return False, str(e)
     
     def test_connection(self, server: Dict) -> Tuple[bool, str]:
         """Тестирование подключения к серверу"""
+        # Учетные данные проверяются новым подключением, которое закрывается
+        # после проверки и не попадает в пул
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Подготовка аутентификации
-            auth_kwargs = {
-                'hostname': server['ip_address'],
-                'port': server['port'],
-                'username': server['username'],
-                'timeout': 10
-            }
-            
-            if server['password_encrypted']:
-                password = self.crypto.decrypt(server['password_encrypted'])
-                auth_kwargs['password'] = password
-            elif server['key_path'] and os.path.exists(server['key_path']):
-                auth_kwargs['key_filename'] = server['key_path']
-            else:
+            client = self._connect(server)
+            if client is None:
                 return False, "No authentication method available"
-            
-            client.connect(**auth_kwargs)
-            client.close()
+            try:
+                channel = client.get_transport().open_session(timeout=self.CONNECT_TIMEOUT)
+                channel.exec_command('true')
+                channel.close()
+            finally:
+                client.close()
             return True, "Connection successful"
-            
         except Exception as e:
             return False, str(e)
     
@@ -371,73 +758,187 @@ class SSHManager:
         
         for attempt in range(max_retries):
             try:
-                client = paramiko.SSHClient()
-                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                
-                # Подготовка аутентификации
-                auth_kwargs = {
-                    'hostname': server['ip_address'],
-                    'port': server['port'],
-                    'username': server['username'],
-                    'timeout': 10
-                }
-                
-                if server['password_encrypted']:
-                    password = self.crypto.decrypt(server['password_encrypted'])
-                    auth_kwargs['password'] = password
-                elif server['key_path'] and os.path.exists(server['key_path']):
-                    auth_kwargs['key_filename'] = server['key_path']
-                else:
+                client = self._acquire(server)
+                if client is None:
                     return False, "No authentication method available"
                 
-                client.connect(**auth_kwargs)
-                
-                # Выполнение команды отключения
-                stdin, stdout, stderr = client.exec_command(server['shutdown_command'])
-                
-                # Ожидание завершения команды (с таймаутом)
-                exit_status = stdout.channel.recv_exit_status()
-                
-                client.close()
+                # Выполнение команды отключения без ожидания кода выхода:
+                # sshd на выключаемом сервере часто завершается раньше
+                with self._session_slot(self._pool_key(server)):
+                    channel = client.get_transport().open_session(timeout=self.CONNECT_TIMEOUT)
+                    channel.exec_command(server['shutdown_command'])
+                    time.sleep(self.SHUTDOWN_GRACE_PERIOD)
+                    
+                    delivered = not channel.exit_status_ready() or channel.recv_exit_status() == 0
+                    error_output = "" if delivered else channel.recv_stderr(4096).decode().strip()
+                    channel.close()
                 
-                if exit_status == 0:
+                if delivered:
+                    self._invalidate(self._pool_key(server))
                     return True, f"Shutdown successful (attempt {attempt + 1})"
-                else:
-                    error_output = stderr.read().decode().strip()
-                    if attempt == max_retries - 1:
-                        return False, f"Shutdown failed: {error_output}"
+                elif attempt == max_retries - 1:
+                    return False, f"Shutdown failed: {error_output}"
                 
             except Exception as e:
+                self._invalidate(self._pool_key(server))
                 if attempt == max_retries - 1:
                     return False, f"Connection failed after {max_retries} attempts: {str(e)}"
                 time.sleep(2)  # Пауза перед повтором
         
         return False, "Max retries exceeded"
+    
+    async def check_ports(self, servers: List[Dict]) -> List[Tuple[bool, str]]:
+        """Параллельная проверка доступности SSH-портов нескольких серверов"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self.is_port_open, server)
+            for server in servers
+        ))
+    
+    async def shutdown_servers(self, servers: List[Dict]) -> List[Tuple[bool, str]]:
+        """Параллельное отключение нескольких серверов"""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self.shutdown_server, server)
+            for server in servers
+        ))
+
+@dataclass(slots=True)
+class UserDialog:
+    """Состояние диалога пользователя и собранные данные сервера"""
+    state: str = ""
+    name: Optional[str] = None
+    ip: Optional[str] = None
+    port: Optional[int] = None
+    username: Optional[str] = None
+    password: Optional[str] = None
+    key_path: Optional[str] = None
+    shutdown_command: Optional[str] = None
 
 class ServerBot:
     """Основной класс Telegram-бота"""
     
-    def __init__(self, token: str, allowed_username: str):
+    def __init__(self, token: str, allowed_username: str, allowed_user_id: Optional[int] = None):
         self.token = token
         self.allowed_username = allowed_username.replace('@', '')
+        # Числовые ID разрешенных пользователей; если ID не задан в конфигурации,
+        # он определяется по имени пользователя при первом обращении
+        self._allowed_ids: frozenset = frozenset() if allowed_user_id is None else frozenset((allowed_user_id,))
         self.db = DatabaseManager()
         self.ssh = SSHManager()
+        self.crypto = get_crypto()
         self.power_monitor = PowerMonitor(self)
         self.application = None
+        self._maintenance_task = None
+        
+        # Кэш проверок доступности серверов: (ip, порт) -> (время, онлайн, сообщение)
+        self._conn_cache: Dict[Tuple[str, int], Tuple[float, bool, str]] = {}
+        self._conn_cache_ttl = 15.0
+        
+        # Ограничения Telegram на исходящие сообщения: ~30 в секунду на бота
+        # и ~1 в секунду на один чат. Хранятся запланированные моменты отправки.
+        self._send_slots = collections.deque(maxlen=30)
+        self._chat_last_send: Dict[Union[int, str], float] = {}
+        self._chat_send_interval = 1.0
         
         # Состояния для диалогов
-        self.user_states = {}
-        self.temp_server_data = {}
+        self._dialogs: Dict[int, UserDialog] = {}
+        
+        # Таблицы маршрутизации кнопок главного меню и callback-запросов
+        self._menu_routes = {
+            "📊 Status": self.status_handler,
+            "🖥️ Servers": self.servers_menu_handler,
+            "📋 Logs": self.show_logs,
+            "🧪 Test Shutdown": self.test_shutdown,
+            "⚙️ Settings": self.show_settings,
+        }
+        self._callback_routes = {
+            "add_server": self.start_add_server,
+            "list_servers": self.list_servers,
+            "remove_server": self.start_remove_server,
+        }
+        
+        # Клавиатура меню серверов неизменна, клавиатура удаления
+        # перестраивается только при изменении списка серверов
+        self._servers_menu_markup = InlineKeyboardMarkup([
+            [InlineKeyboardButton("➕ Добавить сервер", callback_data="add_server")],
+            [InlineKeyboardButton("📋 Список серверов", callback_data="list_servers")],
+            [InlineKeyboardButton("✏️ Редактировать сервер", callback_data="edit_server")],
+            [InlineKeyboardButton("🗑️ Удалить сервер", callback_data="remove_server")]
+        ])
+        self._remove_markup_cache: Optional[Tuple[int, InlineKeyboardMarkup]] = None
+    
+    async def _send(self, chat_id: Union[int, str], method, /, *args, **kwargs):
+        """Вызов метода Bot API с учетом ограничений частоты отправки"""
+        # chat_id - только ключ ограничения, он передается позиционно и не
+        # конфликтует с chat_id= в аргументах самого метода
+        now = time.monotonic()
+        slot = max(now, self._chat_last_send.get(chat_id, 0.0) + self._chat_send_interval)
+        if len(self._send_slots) == self._send_slots.maxlen:
+            slot = max(slot, self._send_slots[0] + 1.0)
+        # Слот резервируется до ожидания, чтобы параллельные вызовы вставали в очередь
+        self._chat_last_send[chat_id] = slot
+        self._send_slots.append(slot)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        
+        try:
+            return await method(*args, **kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            logger.warning(f"Flood control exceeded, retrying in {retry_after} s")
+            await asyncio.sleep(retry_after)
+            return await method(*args, **kwargs)
     
     def is_authorized(self, update: Update) -> bool:
         """Проверка авторизации пользователя"""
-        if not update.effective_user:
+        user = update.effective_user
+        if user is None:
             return False
-        return update.effective_user.username == self.allowed_username
+        if user.id in self._allowed_ids:
+            return True
+        
+        # Первое обращение: сверяем имя пользователя и запоминаем его ID
+        if not self._allowed_ids and user.username == self.allowed_username:
+            self._allowed_ids = frozenset((user.id,))
+            return True
+        return False
+    
+    @property
+    def _alert_chat_id(self) -> Union[int, str]:
+        """Чат для уведомлений: личный чат по ID, если он уже известен"""
+        for user_id in self._allowed_ids:
+            return user_id
+        return f"@{self.allowed_username}"
+    
+    async def _probe_servers(self, servers: List[Dict]) -> List[Tuple[bool, str]]:
+        """Параллельная проверка доступности серверов с кэшированием результатов"""
+        now = time.monotonic()
+        results = {}
+        stale = []
+        for server in servers:
+            key = (server['ip_address'], server['port'])
+            cached = self._conn_cache.get(key)
+            if cached is not None and now - cached[0] < self._conn_cache_ttl:
+                results[key] = (cached[1], cached[2])
+            else:
+                stale.append(server)
+        
+        if stale:
+            probed = await self.ssh.check_ports(stale)
+            for server, (is_online, message) in zip(stale, probed):
+                key = (server['ip_address'], server['port'])
+                self._conn_cache[key] = (now, is_online, message)
+                results[key] = (is_online, message)
+        
+        return [results[(server['ip_address'], server['port'])] for server in servers]
     
     async def start_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
         if not self.is_authorized(update):
+            # Посторонние не расходуют слоты ограничителя и не попадают в его таблицу
             await update.message.reply_text("Access denied. You are not authorized to use this bot.")
             return
         
@@ -459,7 +960,10 @@ class ServerBot:
             "Мониторинг питания запущен ✅"
         )
         
-        await update.message.reply_text(welcome_text, parse_mode='Markdown', reply_markup=reply_markup)
+        await self._send(
+            update.effective_chat.id, update.message.reply_text,
+            welcome_text, parse_mode='Markdown', reply_markup=reply_markup
+        )
         
         # Запуск мониторинга питания
         if not self.power_monitor.is_monitoring:
@@ -473,58 +977,341 @@ class ServerBot:
         # Получение статуса питания
         charging_status = "🔌 Подключено" if self.power_monitor.is_charging else "🔋 От батареи"
         
-        # Получение списка серверов
-        servers = self.db.get_servers()
-        server_count = len(servers)
+        # Получение первых серверов для показа и общего количества
+        servers = await asyncio.to_thread(self.db.get_servers, limit=5)  # Показываем только первые 5
+        server_count = await asyncio.to_thread(self.db.get_server_count)
+        
+        # Проверка доступности серверов
+        online_servers = 0
+        offline_servers = 0
+        
+        parts = [
+            _STATUS_HDR,
+            f"⚡ Питание: {charging_status}\n",
+            f"🖥️ Серверов: {server_count}\n"
+        ]
+        
+        if servers:
+            parts.append("\n*Статус серверов:*\n")
+            for server, (is_online, message) in zip(servers, await self._probe_servers(servers)):
+                status_icon = "🟢" if is_online else "🔴"
+                parts.append(_STATUS_ROW_FMT.format(
+                    icon=status_icon, name=server['name'], ip=server['ip_address']
+                ))
+                if is_online:
+                    online_servers += 1
+                else:
+                    offline_servers += 1
+            
+            if server_count > len(servers):
+                parts.append(f"... и еще {server_count - len(servers)} серверов\n")
+        
+        parts.append(f"\n🟢 Онлайн: {online_servers}\n")
+        parts.append(f"🔴 Офлайн: {offline_servers}\n")
+        
+        # Информация о мониторинге
+        monitoring_status = "✅ Активен" if self.power_monitor.is_monitoring else "❌ Неактивен"
+        parts.append(f"\n🔍 Мониторинг: {monitoring_status}\n")
+        
+        await self._send(
+            update.effective_chat.id, update.message.reply_text,
+            "".join(parts), parse_mode='Markdown'
+        )
+    
+    async def servers_menu_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик меню серверов"""
+        if not self.is_authorized(update):
+            return
+        
+        await self._send(
+            update.effective_chat.id, update.message.reply_text,
+            _SERVERS_MENU_TEXT,
+            parse_mode='Markdown',
+            reply_markup=self._servers_menu_markup
+        )
+    
+    async def callback_query_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик callback запросов"""
+        if not self.is_authorized(update):
+            return
+        
+        query = update.callback_query
+        await query.answer()
+        
+        handler = self._callback_routes.get(query.data)
+        if handler is not None:
+            await handler(update, context)
+        elif query.data.startswith("remove_"):
+            server_name = query.data[len("remove_"):]
+            await self.confirm_remove_server(update, context, server_name)
+    
+    async def start_add_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Начало процесса добавления сервера"""
+        user_id = update.effective_user.id
+        self._dialogs[user_id] = UserDialog(state="adding_server_name")
+        
+        await self._send(
+            update.effective_chat.id, update.callback_query.edit_message_text,
+            "➕ *Добавление сервера*\n\n"
+            "Введите название сервера (например: 'Main Server' или 'DB-1'):",
+            parse_mode='Markdown'
+        )
+    
+    async def list_servers(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Список серверов"""
+        servers = await asyncio.to_thread(self.db.get_servers)
+        
+        if not servers:
+            text = _LIST_HDR + "Серверы не добавлены"
+        else:
+            parts = [_LIST_HDR]
+            # Тестирование подключения ко всем серверам параллельно
+            for server, (is_online, _) in zip(servers, await self._probe_servers(servers)):
+                status_icon = "🟢" if is_online else "🔴"
+                
+                parts.append(_LIST_ROW_FMT.format(
+                    icon=status_icon,
+                    name=server['name'],
+                    ip=server['ip_address'],
+                    port=server['port'],
+                    user=server['username'],
+                    created=server['created_at'][:10]
+                ))
+            text = "".join(parts)
+        
+        await self._send(
+            update.effective_chat.id, update.callback_query.edit_message_text,
+            text, parse_mode='Markdown'
+        )
+    
+    async def start_remove_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Начало процесса удаления сервера"""
+        # Версия читается до списка: при гонке с изменением кэш просто устареет
+        version = self.db.servers_version
+        servers = await asyncio.to_thread(self.db.get_servers)
+        
+        if not servers:
+            await self._send(
+                update.effective_chat.id, update.callback_query.edit_message_text,
+                "🗑️ Нет серверов для удаления"
+            )
+            return
+        
+        cached = self._remove_markup_cache
+        if cached is not None and cached[0] == version:
+            reply_markup = cached[1]
+        else:
+            keyboard = []
+            for server in servers:
+                keyboard.append([InlineKeyboardButton(
+                    f"🗑️ {server['name']}", 
+                    callback_data=f"remove_{server['name']}"
+                )])
+            
+            reply_markup = InlineKeyboardMarkup(keyboard)
+            self._remove_markup_cache = (version, reply_markup)
+        
+        await self._send(
+            update.effective_chat.id, update.callback_query.edit_message_text,
+            "🗑️ *Удаление сервера*\n\nВыберите сервер для удаления:",
+            parse_mode='Markdown',
+            reply_markup=reply_markup
+        )
+    
+    async def confirm_remove_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE, server_name: str):
+        """Подтверждение удаления сервера"""
+        for server in await asyncio.to_thread(self.db.get_servers):
+            if server['name'] == server_name:
+                self._conn_cache.pop((server['ip_address'], server['port']), None)
+                await asyncio.to_thread(self.ssh.evict, server)
+        
+        success = await asyncio.to_thread(self.db.remove_server, server_name)
+        
+        if success:
+            text = f"✅ Сервер '{server_name}' успешно удален"
+            self.db.log_event("server_removed", f"Server {server_name} removed", server_name)
+        else:
+            text = f"❌ Ошибка при удалении сервера '{server_name}'"
+        
+        await self._send(update.effective_chat.id, update.callback_query.edit_message_text, text)
+    
+    async def message_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик текстовых сообщений"""
+        if not self.is_authorized(update):
+            return
+        
+        user_id = update.effective_user.id
+        text = update.message.text
+        
+        # Обработка кнопок главного меню
+        handler = self._menu_routes.get(text)
+        if handler is not None:
+            await handler(update, context)
+            return
+        
+        # Обработка состояний диалогов
+        dialog = self._dialogs.get(user_id)
+        if dialog is not None:
+            await self.handle_dialog_state(update, context, dialog, text)
+    
+    async def handle_dialog_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
+                                 dialog: UserDialog, text: str):
+        """Обработка состояний диалогов"""
+        state = dialog.state
+        
+        if state == "adding_server_name":
+            dialog.name = text
+            dialog.state = "adding_server_ip"
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                "📍 Введите IP-адрес сервера в локальной сети\n"
+                "(например: 192.168.1.100):"
+            )
+        
+        elif state == "adding_server_ip":
+            dialog.ip = text
+            dialog.state = "adding_server_port"
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                "🚪 Введите порт SSH (или нажмите Enter для порта 22 по умолчанию):"
+            )
+        
+        elif state == "adding_server_port":
+            # Проверка формата без исключений; isascii() отсекает цифры Unicode,
+            # которые isdigit() принимает, а int() - нет
+            port_text = text.strip()
+            if not port_text:
+                port = 22
+            elif port_text.isascii() and port_text.isdigit() and len(port_text) <= 5:
+                port = int(port_text)
+            else:
+                await self._send(
+                    update.effective_chat.id, update.message.reply_text,
+                    "❌ Введите корректный номер порта"
+                )
+                return
+            
+            if 1 <= port <= 65535:
+                dialog.port = port
+                dialog.state = "adding_server_username"
+                await self._send(
+                    update.effective_chat.id, update.message.reply_text,
+                    "👤 Введите имя пользователя для SSH:"
+                )
+            else:
+                await self._send(
+                    update.effective_chat.id, update.message.reply_text,
+                    "❌ Порт должен быть от 1 до 65535"
+                )
+        
+        elif state == "adding_server_username":
+            dialog.username = text
+            dialog.state = "adding_server_password"
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                "🔐 Введите пароль для SSH\n"
+                "(или отправьте 'key' если используете SSH-ключ):"
+            )
+        
+        elif state == "adding_server_password":
+            if text.lower() == 'key':
+                dialog.state = "adding_server_key"
+                await self._send(
+                    update.effective_chat.id, update.message.reply_text,
+                    "🔑 Введите полный путь к SSH-ключу\n"
+                    "(например: /data/data/com.termux/files/home/.ssh/id_rsa):"
+                )
+            else:
+                dialog.password = text
+                dialog.state = "adding_server_command"
+                await self._send(
+                    update.effective_chat.id, update.message.reply_text,
+                    "⚡ Введите команду для безопасного отключения\n"
+                    "(или нажмите Enter для 'sudo shutdown -h now'):"
+                )
+        
+        elif state == "adding_server_key":
+            dialog.key_path = text
+            dialog.state = "adding_server_command"
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                "⚡ Введите команду для безопасного отключения\n"
+                "(или нажмите Enter для 'sudo shutdown -h now'):"
+            )
+        
+        elif state == "adding_server_command":
+            shutdown_command = text.strip() if text.strip() else 'sudo shutdown -h now'
+            dialog.shutdown_command = shutdown_command
+            
+            # Завершение добавления сервера
+            await self.finish_add_server(update, context, update.effective_user.id)
+    
+    async def finish_add_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        """Завершение добавления сервера"""
+        # Диалог завершается в любом случае
+        server_data = self._dialogs.pop(user_id)
+        
+        # Тестирование подключения
+        test_server = {
+            'name': server_data.name,
+            'ip_address': server_data.ip,
+            'port': server_data.port,
+            'username': server_data.username,
+            'password_encrypted': None,
+            'key_path': server_data.key_path,
+            'shutdown_command': server_data.shutdown_command
+        }
+        
+        if server_data.password is not None:
+            test_server['password_encrypted'] = self.crypto.encrypt(server_data.password)
         
         # Проверка подключения
-        is_connected, message = self.ssh.test_connection(test_server)
+        self._conn_cache.pop((server_data.ip, server_data.port), None)
+        # Введенные данные проверяются новым подключением, а не подключением из пула
+        is_connected, message = await asyncio.to_thread(self.ssh.test_connection, test_server)
         
         if not is_connected:
-            await update.message.reply_text(
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
                 f"❌ Ошибка подключения к серверу:\n{message}\n\n"
                 "Проверьте данные и попробуйте еще раз. Начните с команды /start"
             )
-            # Очистка состояния
-            del self.user_states[user_id]
-            del self.temp_server_data[user_id]
             return
         
         # Сохранение в базу данных
-        success = self.db.add_server(
-            name=server_data['name'],
-            ip=server_data['ip'],
-            port=server_data['port'],
-            username=server_data['username'],
-            password=server_data.get('password'),
-            key_path=server_data.get('key_path'),
-            shutdown_command=server_data['shutdown_command']
+        success = await asyncio.to_thread(
+            self.db.add_server,
+            name=server_data.name,
+            ip=server_data.ip,
+            port=server_data.port,
+            username=server_data.username,
+            password=server_data.password,
+            key_path=server_data.key_path,
+            shutdown_command=server_data.shutdown_command
         )
         
         if success:
-            await update.message.reply_text(
-                f"✅ Сервер '{server_data['name']}' успешно добавлен!\n"
-                f"📍 IP: {server_data['ip']}:{server_data['port']}\n"
-                f"👤 Пользователь: {server_data['username']}\n"
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                f"✅ Сервер '{server_data.name}' успешно добавлен!\n"
+                f"📍 IP: {server_data.ip}:{server_data.port}\n"
+                f"👤 Пользователь: {server_data.username}\n"
                 f"✅ Подключение протестировано успешно"
             )
-            self.db.log_event("server_added", f"Server {server_data['name']} added successfully", server_data['name'])
+            self.db.log_event("server_added", f"Server {server_data.name} added successfully", server_data.name)
         else:
-            await update.message.reply_text(
-                f"❌ Ошибка при сохранении сервера '{server_data['name']}'\n"
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                f"❌ Ошибка при сохранении сервера '{server_data.name}'\n"
                 "Возможно, сервер с таким именем уже существует"
             )
-        
-        # Очистка состояния
-        del self.user_states[user_id]
-        del self.temp_server_data[user_id]
     
     async def show_logs(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать логи событий"""
         if not self.is_authorized(update):
             return
         
-        logs = self.db.get_recent_logs(10)
+        logs = await asyncio.to_thread(self.db.get_recent_logs, 10)
         
         if not logs:
             text = "📋 *Журнал событий*\n\nСобытий пока нет"
@@ -535,7 +1322,7 @@ class ServerBot:
                 icon = self._get_event_icon(log['event_type'])
                 text += f"{icon} `{timestamp}` {log['message']}\n"
         
-        await update.message.reply_text(text, parse_mode='Markdown')
+        await self._send(update.effective_chat.id, update.message.reply_text, text, parse_mode='Markdown')
     
     def _get_event_icon(self, event_type: str) -> str:
         """Получить иконку для типа события"""
@@ -555,13 +1342,17 @@ class ServerBot:
         if not self.is_authorized(update):
             return
         
-        servers = self.db.get_servers()
+        servers = await asyncio.to_thread(self.db.get_servers)
         
         if not servers:
-            await update.message.reply_text("🧪 Нет серверов для тестирования")
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                "🧪 Нет серверов для тестирования"
+            )
             return
         
-        await update.message.reply_text(
+        await self._send(
+            update.effective_chat.id, update.message.reply_text,
             "🧪 *Тестовое отключение серверов*\n\n"
             "⚠️ ВНИМАНИЕ: Это приведет к реальному отключению серверов!\n"
             "Для подтверждения отправьте: `CONFIRM TEST`",
@@ -569,7 +1360,7 @@ class ServerBot:
         )
         
         # Установка состояния ожидания подтверждения
-        self.user_states[update.effective_user.id] = "confirming_test"
+        self._dialogs[update.effective_user.id] = UserDialog(state="confirming_test")
     
     async def show_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Показать настройки бота"""
@@ -579,13 +1370,14 @@ class ServerBot:
         monitoring_status = "✅ Включен" if self.power_monitor.is_monitoring else "❌ Выключен"
         charging_status = "🔌 Подключено" if self.power_monitor.is_charging else "🔋 От батареи"
         
-        text = f"⚙️ *Настройки бота*\n\n"
-        text += f"🔍 Мониторинг питания: {monitoring_status}\n"
-        text += f"⚡ Текущее состояние: {charging_status}\n"
-        text += f"👤 Авторизованный пользователь: @{self.allowed_username}\n"
-        text += f"📂 База данных: {'✅ Доступна' if os.path.exists(self.db.db_path) else '❌ Недоступна'}\n"
-        text += f"🔐 Шифрование: {'✅ Активно' if os.path.exists('encryption.key') else '❌ Неактивно'}\n\n"
-        text += f"📊 Серверов в базе: {len(self.db.get_servers())}\n"
+        text = _SETTINGS_FMT.format(
+            monitoring=monitoring_status,
+            charging=charging_status,
+            username=self.allowed_username,
+            database='✅ Доступна' if os.path.exists(self.db.db_path) else '❌ Недоступна',
+            encryption='✅ Активно' if os.path.exists('encryption.key') else '❌ Неактивно',
+            server_count=await asyncio.to_thread(self.db.get_server_count)
+        )
         
         keyboard = [
             [InlineKeyboardButton("🔄 Перезапустить мониторинг", callback_data="restart_monitoring")],
@@ -593,21 +1385,20 @@ class ServerBot:
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await update.message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
+        await self._send(
+            update.effective_chat.id, update.message.reply_text,
+            text, parse_mode='Markdown', reply_markup=reply_markup
+        )
     
     async def handle_power_loss(self):
         """Обработка потери питания"""
         try:
             # Отправка немедленного уведомления
-            message = (
-                "🚨 *ОТКЛЮЧЕНИЕ ЭЛЕКТРОПИТАНИЯ!*\n\n"
-                "⚡ Обнаружено отключение от сети\n"
-                f"🕐 Время: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n\n"
-                "🔄 Начинаю безопасное отключение серверов..."
-            )
+            message = _POWER_LOSS_FMT.format(ts=datetime.now().strftime('%d.%m.%Y %H:%M:%S'))
             
-            await self.application.bot.send_message(
-                chat_id=f"@{self.allowed_username}",
+            await self._send(
+                self._alert_chat_id, self.application.bot.send_message,
+                chat_id=self._alert_chat_id,
                 text=message,
                 parse_mode='Markdown'
             )
@@ -616,20 +1407,21 @@ class ServerBot:
             self.db.log_event("power_loss", "Power loss detected, starting server shutdown sequence")
             
             # Получение списка серверов
-            servers = self.db.get_servers()
+            servers = await asyncio.to_thread(self.db.get_servers)
             
             if not servers:
-                await self.application.bot.send_message(
-                    chat_id=f"@{self.allowed_username}",
+                await self._send(
+                    self._alert_chat_id, self.application.bot.send_message,
+                    chat_id=self._alert_chat_id,
                     text="ℹ️ Серверы для отключения не найдены"
                 )
                 return
             
-            # Отключение каждого сервера
+            # Параллельное отключение всех серверов
+            results = await self.ssh.shutdown_servers(servers)
+            
             shutdown_results = []
-            for server in servers:
-                success, message = self.ssh.shutdown_server(server)
-                
+            for server, (success, message) in zip(servers, results):
                 status_icon = "✅" if success else "❌"
                 result_text = f"{status_icon} {server['name']}: {message}"
                 shutdown_results.append(result_text)
@@ -644,8 +1436,9 @@ class ServerBot:
             
             # Отправка отчета
             report = "📋 *Отчет об отключении серверов:*\n\n" + "\n".join(shutdown_results)
-            await self.application.bot.send_message(
-                chat_id=f"@{self.allowed_username}",
+            await self._send(
+                self._alert_chat_id, self.application.bot.send_message,
+                chat_id=self._alert_chat_id,
                 text=report,
                 parse_mode='Markdown'
             )
@@ -664,16 +1457,14 @@ class ServerBot:
                 minutes, _ = divmod(remainder, 60)
                 duration = f"Длительность отключения: {int(hours):02d}:{int(minutes):02d}"
             
-            message = (
-                "🔌 *ПИТАНИЕ ВОССТАНОВЛЕНО*\n\n"
-                "✅ Подключение к электросети восстановлено\n"
-                f"🕐 Время восстановления: {datetime.now().strftime('%d.%m.%Y %H:%M:%S')}\n"
-                f"{duration}\n\n"
-                "ℹ️ Серверы могут потребовать ручного запуска"
+            message = _POWER_RESTORE_FMT.format(
+                ts=datetime.now().strftime('%d.%m.%Y %H:%M:%S'),
+                duration=duration
             )
             
-            await self.application.bot.send_message(
-                chat_id=f"@{self.allowed_username}",
+            await self._send(
+                self._alert_chat_id, self.application.bot.send_message,
+                chat_id=self._alert_chat_id,
                 text=message,
                 parse_mode='Markdown'
             )
@@ -689,15 +1480,15 @@ class ServerBot:
             hours, remainder = divmod(elapsed.total_seconds(), 3600)
             minutes, _ = divmod(remainder, 60)
             
-            message = (
-                "⚠️ *НАПОМИНАНИЕ: ПИТАНИЕ ВСЕ ЕЩЕ ОТКЛЮЧЕНО*\n\n"
-                f"⏱️ Прошло времени: {int(hours):02d}:{int(minutes):02d}\n"
-                f"🕐 Время: {datetime.now().strftime('%H:%M:%S')}\n\n"
-                "🔋 Устройство работает от батареи"
+            message = _POWER_REMINDER_FMT.format(
+                hours=int(hours),
+                minutes=int(minutes),
+                ts=datetime.now().strftime('%H:%M:%S')
             )
             
-            await self.application.bot.send_message(
-                chat_id=f"@{self.allowed_username}",
+            await self._send(
+                self._alert_chat_id, self.application.bot.send_message,
+                chat_id=self._alert_chat_id,
                 text=message,
                 parse_mode='Markdown'
             )
@@ -708,14 +1499,17 @@ class ServerBot:
     async def handle_test_confirmation(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка подтверждения тестового отключения"""
         if update.message.text == "CONFIRM TEST":
-            servers = self.db.get_servers()
+            servers = await asyncio.to_thread(self.db.get_servers)
+            
+            await self._send(
+                update.effective_chat.id, update.message.reply_text,
+                "🧪 Начинаю тестовое отключение серверов..."
+            )
             
-            await update.message.reply_text("🧪 Начинаю тестовое отключение серверов...")
+            results = await self.ssh.shutdown_servers(servers)
             
             shutdown_results = []
-            for server in servers:
-                success, message = self.ssh.shutdown_server(server)
-                
+            for server, (success, message) in zip(servers, results):
                 status_icon = "✅" if success else "❌"
                 result_text = f"{status_icon} {server['name']}: {message}"
                 shutdown_results.append(result_text)
@@ -728,21 +1522,56 @@ class ServerBot:
                 )
             
             report = "📋 *Результаты тестового отключения:*\n\n" + "\n".join(shutdown_results)
-            await update.message.reply_text(report, parse_mode='Markdown')
+            await self._send(update.effective_chat.id, update.message.reply_text, report, parse_mode='Markdown')
         else:
-            await update.message.reply_text("❌ Тестовое отключение отменено")
+            await self._send(update.effective_chat.id, update.message.reply_text, "❌ Тестовое отключение отменено")
         
         # Сброс состояния
-        del self.user_states[update.effective_user.id]
+        self._dialogs.pop(update.effective_user.id, None)
     
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик ошибок"""
         logger.error(f"Exception while handling an update: {context.error}")
     
+    async def _maintain_db(self):
+        """Периодическое обслуживание базы данных"""
+        while True:
+            await asyncio.sleep(DB_MAINTENANCE_INTERVAL)
+            try:
+                deleted = await asyncio.to_thread(self.db.trim_logs)
+                if deleted:
+                    logger.info(f"Database maintenance: removed {deleted} old log entries")
+            except Exception as e:
+                logger.error(f"Error in database maintenance: {e}")
+    
+    async def _post_init(self, application: Application):
+        """Запуск фоновых задач после инициализации приложения"""
+        self._maintenance_task = asyncio.create_task(self._maintain_db())
+    
+    async def _post_shutdown(self, application: Application):
+        """Остановка фоновых задач"""
+        self.power_monitor.stop_monitoring()
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+    
     def run(self):
         """Запуск бота"""
         # Создание приложения
-        self.application = Application.builder().token(self.token).build()
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            # Постоянный пул HTTPS-подключений к Bot API: ответы обработчиков и
+            # уведомления переиспользуют уже установленные TLS-сессии
+            .connection_pool_size(32)
+            .pool_timeout(10)
+            .connect_timeout(5)
+            .read_timeout(10)
+            # getUpdates всегда выполняется по одному запросу за раз
+            .get_updates_connection_pool_size(1)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         
         # Добавление обработчиков
         self.application.add_handler(CommandHandler("start", self.start_handler))
@@ -757,15 +1586,38 @@ class ServerBot:
         
         logger.info("Starting Server Management Bot...")
         
-        # Запуск бота
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+        # Запуск бота: webhook, если задан публичный адрес, иначе long polling
+        webhook_url = os.getenv('WEBHOOK_URL')
+        try:
+            if webhook_url:
+                # Локальный путь совпадает с путем публичного адреса, если
+                # прокси не переписывает его (тогда задается WEBHOOK_PATH)
+                url_path = os.getenv('WEBHOOK_PATH', urllib.parse.urlparse(webhook_url).path)
+                self.application.run_webhook(
+                    listen=os.getenv('WEBHOOK_LISTEN', '127.0.0.1'),
+                    port=int(os.getenv('WEBHOOK_PORT', '8443')),
+                    url_path=url_path,
+                    webhook_url=webhook_url,
+                    secret_token=os.getenv('WEBHOOK_SECRET'),
+                    allowed_updates=Update.ALL_TYPES
+                )
+            else:
+                self.application.run_polling(
+                    poll_interval=0.0,
+                    timeout=30,
+                    allowed_updates=Update.ALL_TYPES
+                )
+        finally:
+            self.ssh.close_all()
+            self.db.close()
     
     async def _message_router(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Маршрутизатор сообщений"""
         user_id = update.effective_user.id
         
         # Проверка состояния подтверждения теста
-        if user_id in self.user_states and self.user_states[user_id] == "confirming_test":
+        dialog = self._dialogs.get(user_id)
+        if dialog is not None and dialog.state == "confirming_test":
             await self.handle_test_confirmation(update, context)
         else:
             await self.message_handler(update, context)
@@ -774,27 +1626,29 @@ def load_config() -> tuple:
     """Загрузка конфигурации из переменных окружения"""
     bot_token = os.getenv('BOT_TOKEN')
     allowed_user = os.getenv('ALLOWED_USER', '@mgmwm')
+    allowed_user_id = os.getenv('ALLOWED_USER_ID')
     
     if not bot_token:
         logger.error("BOT_TOKEN environment variable is required!")
         exit(1)
     
-    return bot_token, allowed_user
+    if allowed_user_id is not None:
+        try:
+            allowed_user_id = int(allowed_user_id)
+        except ValueError:
+            logger.error("ALLOWED_USER_ID must be a numeric Telegram user ID!")
+            exit(1)
+    
+    return bot_token, allowed_user, allowed_user_id
 
 def setup_termux_environment():
     """Настройка окружения Termux"""
-    try:
-        # Проверка доступности termux-battery-status
-        result = subprocess.run(['which', 'termux-battery-status'], 
-                              capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.warning("termux-battery-status not found. Install termux-api package.")
-            print("To install termux-api:")
-            print("pkg install termux-api")
-            print("Also install Termux:API from Google Play Store")
-    
-    except Exception as e:
-        logger.error(f"Error setting up Termux environment: {e}")
+    # Проверка доступности termux-battery-status (поиск по PATH без запуска процесса)
+    if shutil.which('termux-battery-status') is None:
+        logger.warning("termux-battery-status not found. Install termux-api package.")
+        print("To install termux-api:")
+        print("pkg install termux-api")
+        print("Also install Termux:API from Google Play Store")
 
 def create_systemd_service():
     """Создание службы для автозапуска (для Termux)"""
@@ -803,11 +1657,23 @@ cd {os.getcwd()}
 python server_bot.py
 """
     
-    # Создание скрипта запуска
-    with open("start_bot.sh", "w") as f:
-        f.write(service_content)
+    # Скрипт не перезаписывается, если он уже актуален
+    try:
+        with open("start_bot.sh") as f:
+            if f.read() == service_content and os.stat(f.fileno()).st_mode & 0o777 == 0o755:
+                return
+    except OSError:
+        pass
     
-    os.chmod("start_bot.sh", 0o755)
+    # Создание скрипта запуска
+    try:
+        with open("start_bot.sh", "w") as f:
+            f.write(service_content)
+        
+        os.chmod("start_bot.sh", 0o755)
+    except OSError as e:
+        logger.warning(f"Could not create start_bot.sh: {e}")
+        return
     
     print("Created start_bot.sh for manual startup")
     print("To run in background: nohup ./start_bot.sh &")
@@ -821,17 +1687,19 @@ def main():
     
     # Загрузка конфигурации
     try:
-        bot_token, allowed_user = load_config()
+        bot_token, allowed_user, allowed_user_id = load_config()
     except SystemExit:
         print("\n❌ Configuration error!")
         print("Please set the BOT_TOKEN environment variable:")
         print("export BOT_TOKEN='your_bot_token_here'")
         print("export ALLOWED_USER='@your_username'  # optional, defaults to @mgmwm")
+        print("export ALLOWED_USER_ID='123456789'  # optional, numeric ID instead of username check")
+        print("export WEBHOOK_URL='https://your.domain/path'  # optional, enables webhook mode")
         return
     
     # Создание и запуск бота
     try:
-        bot = ServerBot(bot_token, allowed_user)
+        bot = ServerBot(bot_token, allowed_user, allowed_user_id)
         
         # Создание службы автозапуска
         create_systemd_service()
@@ -849,256 +1717,4 @@ def main():
         print(f"❌ Fatal error: {e}")
 
 if __name__ == "__main__":
-    main()верка доступности серверов
-        online_servers = 0
-        offline_servers = 0
-        
-        status_text = f"📊 *Статус системы*\n\n"
-        status_text += f"⚡ Питание: {charging_status}\n"
-        status_text += f"🖥️ Серверов: {server_count}\n"
-        
-        if servers:
-            status_text += f"\n*Статус серверов:*\n"
-            for server in servers[:5]:  # Показываем только первые 5
-                is_online, message = self.ssh.test_connection(server)
-                status_icon = "🟢" if is_online else "🔴"
-                status_text += f"{status_icon} {server['name']} ({server['ip_address']})\n"
-                if is_online:
-                    online_servers += 1
-                else:
-                    offline_servers += 1
-            
-            if len(servers) > 5:
-                status_text += f"... и еще {len(servers) - 5} серверов\n"
-        
-        status_text += f"\n🟢 Онлайн: {online_servers}\n"
-        status_text += f"🔴 Офлайн: {offline_servers}\n"
-        
-        # Информация о мониторинге
-        monitoring_status = "✅ Активен" if self.power_monitor.is_monitoring else "❌ Неактивен"
-        status_text += f"\n🔍 Мониторинг: {monitoring_status}\n"
-        
-        await update.message.reply_text(status_text, parse_mode='Markdown')
-    
-    async def servers_menu_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик меню серверов"""
-        if not self.is_authorized(update):
-            return
-        
-        keyboard = [
-            [InlineKeyboardButton("➕ Добавить сервер", callback_data="add_server")],
-            [InlineKeyboardButton("📋 Список серверов", callback_data="list_servers")],
-            [InlineKeyboardButton("✏️ Редактировать сервер", callback_data="edit_server")],
-            [InlineKeyboardButton("🗑️ Удалить сервер", callback_data="remove_server")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.message.reply_text(
-            "🖥️ *Управление серверами*\n\nВыберите действие:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    
-    async def callback_query_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик callback запросов"""
-        if not self.is_authorized(update):
-            return
-        
-        query = update.callback_query
-        await query.answer()
-        
-        if query.data == "add_server":
-            await self.start_add_server(update, context)
-        elif query.data == "list_servers":
-            await self.list_servers(update, context)
-        elif query.data == "remove_server":
-            await self.start_remove_server(update, context)
-        elif query.data.startswith("remove_"):
-            server_name = query.data.replace("remove_", "")
-            await self.confirm_remove_server(update, context, server_name)
-    
-    async def start_add_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Начало процесса добавления сервера"""
-        user_id = update.effective_user.id
-        self.user_states[user_id] = "adding_server_name"
-        self.temp_server_data[user_id] = {}
-        
-        await update.callback_query.edit_message_text(
-            "➕ *Добавление сервера*\n\n"
-            "Введите название сервера (например: 'Main Server' или 'DB-1'):",
-            parse_mode='Markdown'
-        )
-    
-    async def list_servers(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Список серверов"""
-        servers = self.db.get_servers()
-        
-        if not servers:
-            text = "📋 *Список серверов*\n\nСерверы не добавлены"
-        else:
-            text = "📋 *Список серверов*\n\n"
-            for server in servers:
-                # Тестирование подключения
-                is_online, _ = self.ssh.test_connection(server)
-                status_icon = "🟢" if is_online else "🔴"
-                
-                text += f"{status_icon} *{server['name']}*\n"
-                text += f"   📍 {server['ip_address']}:{server['port']}\n"
-                text += f"   👤 {server['username']}\n"
-                text += f"   📅 {server['created_at'][:10]}\n\n"
-        
-        await update.callback_query.edit_message_text(text, parse_mode='Markdown')
-    
-    async def start_remove_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Начало процесса удаления сервера"""
-        servers = self.db.get_servers()
-        
-        if not servers:
-            await update.callback_query.edit_message_text("🗑️ Нет серверов для удаления")
-            return
-        
-        keyboard = []
-        for server in servers:
-            keyboard.append([InlineKeyboardButton(
-                f"🗑️ {server['name']}", 
-                callback_data=f"remove_{server['name']}"
-            )])
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.callback_query.edit_message_text(
-            "🗑️ *Удаление сервера*\n\nВыберите сервер для удаления:",
-            parse_mode='Markdown',
-            reply_markup=reply_markup
-        )
-    
-    async def confirm_remove_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE, server_name: str):
-        """Подтверждение удаления сервера"""
-        success = self.db.remove_server(server_name)
-        
-        if success:
-            text = f"✅ Сервер '{server_name}' успешно удален"
-            self.db.log_event("server_removed", f"Server {server_name} removed", server_name)
-        else:
-            text = f"❌ Ошибка при удалении сервера '{server_name}'"
-        
-        await update.callback_query.edit_message_text(text)
-    
-    async def message_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Обработчик текстовых сообщений"""
-        if not self.is_authorized(update):
-            return
-        
-        user_id = update.effective_user.id
-        text = update.message.text
-        
-        # Обработка кнопок главного меню
-        if text == "📊 Status":
-            await self.status_handler(update, context)
-            return
-        elif text == "🖥️ Servers":
-            await self.servers_menu_handler(update, context)
-            return
-        elif text == "📋 Logs":
-            await self.show_logs(update, context)
-            return
-        elif text == "🧪 Test Shutdown":
-            await self.test_shutdown(update, context)
-            return
-        elif text == "⚙️ Settings":
-            await self.show_settings(update, context)
-            return
-        
-        # Обработка состояний диалогов
-        if user_id in self.user_states:
-            await self.handle_dialog_state(update, context, user_id, text)
-    
-    async def handle_dialog_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE, 
-                                 user_id: int, text: str):
-        """Обработка состояний диалогов"""
-        state = self.user_states[user_id]
-        
-        if state == "adding_server_name":
-            self.temp_server_data[user_id]['name'] = text
-            self.user_states[user_id] = "adding_server_ip"
-            await update.message.reply_text(
-                "📍 Введите IP-адрес сервера в локальной сети\n"
-                "(например: 192.168.1.100):"
-            )
-        
-        elif state == "adding_server_ip":
-            self.temp_server_data[user_id]['ip'] = text
-            self.user_states[user_id] = "adding_server_port"
-            await update.message.reply_text(
-                "🚪 Введите порт SSH (или нажмите Enter для порта 22 по умолчанию):"
-            )
-        
-        elif state == "adding_server_port":
-            try:
-                port = int(text) if text.strip() else 22
-                if 1 <= port <= 65535:
-                    self.temp_server_data[user_id]['port'] = port
-                    self.user_states[user_id] = "adding_server_username"
-                    await update.message.reply_text("👤 Введите имя пользователя для SSH:")
-                else:
-                    await update.message.reply_text("❌ Порт должен быть от 1 до 65535")
-            except ValueError:
-                await update.message.reply_text("❌ Введите корректный номер порта")
-        
-        elif state == "adding_server_username":
-            self.temp_server_data[user_id]['username'] = text
-            self.user_states[user_id] = "adding_server_password"
-            await update.message.reply_text(
-                "🔐 Введите пароль для SSH\n"
-                "(или отправьте 'key' если используете SSH-ключ):"
-            )
-        
-        elif state == "adding_server_password":
-            if text.lower() == 'key':
-                self.user_states[user_id] = "adding_server_key"
-                await update.message.reply_text(
-                    "🔑 Введите полный путь к SSH-ключу\n"
-                    "(например: /data/data/com.termux/files/home/.ssh/id_rsa):"
-                )
-            else:
-                self.temp_server_data[user_id]['password'] = text
-                self.user_states[user_id] = "adding_server_command"
-                await update.message.reply_text(
-                    "⚡ Введите команду для безопасного отключения\n"
-                    "(или нажмите Enter для 'sudo shutdown -h now'):"
-                )
-        
-        elif state == "adding_server_key":
-            self.temp_server_data[user_id]['key_path'] = text
-            self.user_states[user_id] = "adding_server_command"
-            await update.message.reply_text(
-                "⚡ Введите команду для безопасного отключения\n"
-                "(или нажмите Enter для 'sudo shutdown -h now'):"
-            )
-        
-        elif state == "adding_server_command":
-            shutdown_command = text.strip() if text.strip() else 'sudo shutdown -h now'
-            self.temp_server_data[user_id]['shutdown_command'] = shutdown_command
-            
-            # Завершение добавления сервера
-            await self.finish_add_server(update, context, user_id)
-    
-    async def finish_add_server(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
-        """Завершение добавления сервера"""
-        server_data = self.temp_server_data[user_id]
-        
-        # Тестирование подключения
-        test_server = {
-            'name': server_data['name'],
-            'ip_address': server_data['ip'],
-            'port': server_data['port'],
-            'username': server_data['username'],
-            'password_encrypted': None,
-            'key_path': server_data.get('key_path'),
-            'shutdown_command': server_data['shutdown_command']
-        }
-        
-        if 'password' in server_data:
-            test_server['password_encrypted'] = CryptoManager().encrypt(server_data['password'])
-        
-        # Про
\ No newline at end of file
+    main()
@@ -0,0 +1,65 @@
+"""
+Уведомления о питании через замоканный Bot API
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class PowerAlertsTest(unittest.TestCase):
+    """handle_power_loss / handle_power_restore / send_power_reminder"""
+
+    def setUp(self):
+        # Бот создает базу, ключ и журнал в текущем каталоге
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+        self.addCleanup(os.chdir, self._cwd)
+
+        import server_management_bot
+        self.bot = server_management_bot.ServerBot("token", "@owner")
+        self.addCleanup(self.bot.db.close)
+        self.addCleanup(self.bot.ssh.close_all)
+        self.bot._chat_send_interval = 0.0
+        self.bot.db = mock.MagicMock()
+        self.bot.db.get_servers.return_value = [{'name': 'srv', 'ip_address': '10.0.0.1', 'port': 22}]
+        self.bot.ssh.shutdown_servers = mock.AsyncMock(return_value=[(True, "ok")])
+        self.bot.application = mock.MagicMock()
+        self.bot.application.bot.send_message = mock.AsyncMock()
+
+    def sent_texts(self):
+        calls = self.bot.application.bot.send_message.await_args_list
+        for call in calls:
+            self.assertEqual(call.kwargs['chat_id'], "@owner")
+        return [call.kwargs['text'] for call in calls]
+
+    def test_power_loss_shuts_down_servers_and_reports(self):
+        asyncio.run(self.bot.handle_power_loss())
+
+        self.bot.ssh.shutdown_servers.assert_awaited_once()
+        texts = self.sent_texts()
+        self.assertEqual(len(texts), 2)
+        self.assertIn("srv", texts[1])
+
+    def test_power_restore_sends_alert(self):
+        asyncio.run(self.bot.handle_power_restore())
+
+        self.assertEqual(len(self.sent_texts()), 1)
+        self.bot.db.log_event.assert_called_once_with("power_restore", "Power restored")
+
+    def test_power_reminder_sends_alert(self):
+        asyncio.run(self.bot.send_power_reminder(timedelta(hours=1, minutes=5)))
+
+        self.assertEqual(len(self.sent_texts()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
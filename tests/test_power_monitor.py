@@ -0,0 +1,91 @@
+"""
+Ожидание изменений статуса батареи, когда драйвер не шлет sysfs_notify
+"""
+
+import asyncio
+import os
+import select
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StatusWaitTest(unittest.TestCase):
+    """PowerMonitor без уведомлений ядра замечает изменение за POLL_INTERVAL"""
+
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+        self.addCleanup(os.chdir, self._cwd)
+
+        import server_management_bot
+        # epoll на пустом канале ведет себя как файл статуса, который не уведомляет
+        read_fd, self.write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, self.write_fd)
+        epoll = select.epoll()
+        epoll.register(read_fd, select.EPOLLIN)
+        self.addCleanup(epoll.close)
+
+        self.monitor = server_management_bot.PowerMonitor.__new__(server_management_bot.PowerMonitor)
+        self.monitor._status_fd = read_fd
+        self.monitor._epoll = epoll
+        self.monitor._events_confirmed = False
+        self.monitor.is_monitoring = False
+        self.monitor.is_charging = True
+        self.monitor.last_power_loss_time = None
+        self.monitor.POLL_INTERVAL = 0.2
+
+    def wait(self):
+        return asyncio.run(self.monitor._wait_for_status_change())
+
+    def test_wait_is_capped_until_driver_notifies(self):
+        start = time.monotonic()
+        notified = self.wait()
+        elapsed = time.monotonic() - start
+
+        self.assertFalse(notified)
+        self.assertFalse(self.monitor._events_confirmed)
+        self.assertLess(elapsed, self.monitor.POLL_INTERVAL + 0.5)
+
+    def test_delivered_event_enables_long_wait(self):
+        os.write(self.write_fd, b'x')
+
+        self.assertTrue(self.wait())
+        self.assertTrue(self.monitor._events_confirmed)
+
+    def test_power_loss_seen_within_poll_interval(self):
+        charging = [True]
+        self.monitor._read_status_fd = lambda: charging[0]
+        self.monitor._get_charging_status = lambda: charging[0]
+        self.monitor._start_notification_cycle = lambda: None
+
+        async def run():
+            detected = asyncio.Event()
+            self.monitor.bot = mock.MagicMock()
+            self.monitor.bot.handle_power_loss = mock.AsyncMock(side_effect=detected.set)
+            self.monitor.is_monitoring = True
+            task = asyncio.create_task(self.monitor._monitor_power())
+            await asyncio.sleep(0.05)
+
+            charging[0] = False
+            start = time.monotonic()
+            await asyncio.wait_for(detected.wait(), self.monitor.EVENT_WAIT_TIMEOUT)
+            elapsed = time.monotonic() - start
+
+            self.monitor.is_monitoring = False
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return elapsed
+
+        self.assertLess(asyncio.run(run()), self.monitor.POLL_INTERVAL + 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Пул SSH-подключений: ключ по учетным данным, проверка вне пула, вытеснение
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SSHPoolTest(unittest.TestCase):
+    """SSHManager._pool_key / test_connection / evict"""
+
+    def setUp(self):
+        # Менеджер создает ключ шифрования в текущем каталоге
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+        self.addCleanup(self._tmp.cleanup)
+        self.addCleanup(os.chdir, self._cwd)
+
+        import server_management_bot
+        self.module = server_management_bot
+        self.ssh = server_management_bot.SSHManager()
+        self.addCleanup(self.ssh.close_all)
+        self.server = {
+            'name': 'srv',
+            'ip_address': '10.0.0.1',
+            'port': 22,
+            'username': 'root',
+            'password_encrypted': self.ssh.crypto.encrypt('secret'),
+            'key_path': None,
+            'shutdown_command': 'true'
+        }
+
+    def test_pool_key_includes_credentials(self):
+        key = self.ssh._pool_key(self.server)
+        typo = dict(self.server, password_encrypted=self.ssh.crypto.encrypt('secrte'))
+        by_key = dict(self.server, password_encrypted=None, key_path='/root/.ssh/id_ed25519')
+
+        self.assertEqual(key, self.ssh._pool_key(dict(self.server)))
+        self.assertNotEqual(key, self.ssh._pool_key(typo))
+        self.assertNotEqual(key, self.ssh._pool_key(by_key))
+
+    def test_connection_check_leaves_pool_untouched(self):
+        with mock.patch.object(self.module.paramiko, 'SSHClient') as client_cls:
+            is_connected, _ = self.ssh.test_connection(self.server)
+
+        self.assertTrue(is_connected)
+        self.assertEqual(self.ssh._pool, {})
+        client_cls.return_value.close.assert_called_once()
+
+    def test_evict_drops_client_and_session_slots(self):
+        key = self.ssh._pool_key(self.server)
+        client = mock.MagicMock()
+        self.ssh._pool[key] = client
+        self.ssh._session_slot(key)
+
+        self.ssh.evict(self.server)
+
+        self.assertNotIn(key, self.ssh._pool)
+        self.assertNotIn(key, self.ssh._session_slots)
+        client.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()